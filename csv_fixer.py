@@ -7,25 +7,139 @@ Also provides migration orchestration for processing all test cases.
 
 import re
 import json
-import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from typing import Dict, List, Any, Optional, Tuple
 
-from qase_api import QaseAPI
+from qase_api import get_client
+from qase_common import load_project_config
+
+
+try:
+    # RE2 guarantees linear-time matching, which keeps pattern 3's lazy
+    # quantifiers safe on pathological field content
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
+
+# Patterns 1 and 2: broken references with an unescaped or escaped "!",
+# i.e. ![filename.csv](url) or \![filename.csv](url). The optional leading
+# backslash is part of the broken pattern, so no "not preceded by a
+# backslash" lookbehind (which RE2 doesn't support) is needed.
+_CSV_LINK_PATTERN = r'\\?!\[([^\]]+\.csv[^\]]*)\]\(([^\)]+)\)'
+
+# Pattern 3: Match fully escaped markdown: \!\[filename\.csv\]\(url\)
+# This handles cases where all markdown syntax is escaped
+# Match: backslash-exclamation-backslash-bracket, then filename with .csv,
+# then backslash-bracket-backslash-paren, then URL, then backslash-paren
+# Use a more flexible pattern that allows escaped chars in filename/URL
+_ESCAPED_CSV_LINK_PATTERN = r'\\!\\\[(.*?\.csv.*?)\\\]\\\((.*?)\\\)'
+
+# Both forms fused into a single alternation so a field is scanned once when
+# looking up references. Group 1 or 4 tells us which form matched.
+_BROKEN_CSV_REF_PATTERN = f'({_CSV_LINK_PATTERN})|({_ESCAPED_CSV_LINK_PATTERN})'
+
+# Markdown escapes to undo in fully escaped references, applied in one pass.
+# URLs may additionally have their slashes escaped.
+_FILENAME_ESCAPE_PATTERN = r'\\([\\_().])'
+_URL_ESCAPE_PATTERN = r'\\([\\_()./])'
+
+_BROKEN_CSV_REF = _re_engine.compile(_BROKEN_CSV_REF_PATTERN)
+_CSV_LINK = _re_engine.compile(_CSV_LINK_PATTERN)
+_ESCAPED_CSV_LINK = _re_engine.compile(_ESCAPED_CSV_LINK_PATTERN)
+_FILENAME_ESCAPE = _re_engine.compile(_FILENAME_ESCAPE_PATTERN)
+_URL_ESCAPE = _re_engine.compile(_URL_ESCAPE_PATTERN)
+
+
+def _fixed_escaped_reference(match: re.Match) -> str:
+    """
+    Build the fixed markdown link for a fully escaped CSV reference match.
+
+    Args:
+        match: Match object from _ESCAPED_CSV_LINK
+
+    Returns:
+        Fixed reference in the form [filename.csv](url)
+    """
+    # The filename and URL have escaped characters that need to be unescaped
+    filename = _FILENAME_ESCAPE.sub(r'\1', match.group(1))
+    url = _URL_ESCAPE.sub(r'\1', match.group(2))
+    return f"[{filename}]({url})"
+
+
+def _fixed_reference(match: re.Match) -> str:
+    """
+    Build the fixed markdown link for a broken CSV reference match.
+
+    Args:
+        match: Match object from _BROKEN_CSV_REF
+
+    Returns:
+        Fixed reference in the form [filename.csv](url)
+    """
+    # The outer group of the matching alternative closes last, so its index
+    # tells the two forms apart
+    if match.lastindex == 1:
+        return f"[{match.group(2)}]({match.group(3)})"
+
+    filename = _FILENAME_ESCAPE.sub(r'\1', match.group(5))
+    url = _URL_ESCAPE.sub(r'\1', match.group(6))
+    return f"[{filename}]({url})"
+
+
+@lru_cache(maxsize=4096)
+def _fix_text_cached(text: str) -> Tuple[Optional[str], int]:
+    """
+    Fix broken CSV references in a non-empty text and count them.
+
+    Cached because projects repeat the same boilerplate preconditions,
+    step actions and custom field values across many test cases.
+
+    Args:
+        text: Text that may contain broken CSV references
+
+    Returns:
+        Tuple of (fixed text if changes were made or None, number of references fixed)
+    """
+    # Same pre-filter as CSVFixer.find_broken_csv_references
+    if '.csv' not in text or '!' not in text:
+        return None, 0
+
+    # Only fully escaped references need unescaping in a Python callback, and
+    # only texts containing an escaped "![" can have them. The far more common
+    # forms are rewritten with a plain template that the regex engine expands.
+    fixed_text = text
+    escaped_count = 0
+    if '\\!\\[' in fixed_text:
+        fixed_text, escaped_count = _ESCAPED_CSV_LINK.subn(_fixed_escaped_reference, fixed_text)
+    fixed_text, count = _CSV_LINK.subn(r'[\1](\2)', fixed_text)
+
+    if fixed_text == text:
+        return None, 0
+    return fixed_text, count + escaped_count
+
+
+# Text fields checked on the test case itself and on each of its steps
+_CASE_TEXT_FIELDS = ("description", "preconditions", "postconditions")
+_STEP_TEXT_FIELDS = ("action", "expected_result", "data")
 
 
 class CSVFixer:
     """Handles fixing broken CSV references in test case fields and migration orchestration."""
 
-    def __init__(self, api_token: Optional[str] = None, project_code: Optional[str] = None):
+    def __init__(self, api_token: Optional[str] = None, project_code: Optional[str] = None, num_workers: int = 8):
         """
         Initialize the CSV fixer.
 
         Args:
             api_token: Qase API token (optional, required for migration)
             project_code: Project code (optional, required for migration)
+            num_workers: Number of concurrent workers used to send updates
         """
-        self.api = QaseAPI(api_token, project_code) if api_token and project_code else None
+        self.api = get_client(api_token, project_code) if api_token and project_code else None
+        self.num_workers = num_workers
 
     @staticmethod
     def find_broken_csv_references(text: Optional[str]) -> List[Tuple[str, str]]:
@@ -43,54 +157,15 @@ class CSVFixer:
         if not text:
             return []
 
+        # Every pattern needs a ".csv" and a "!", so skip the regex scan
+        # entirely for the (common) fields that can't possibly match
+        if '.csv' not in text or '!' not in text:
+            return []
+
         broken_refs = []
-        
-        # Pattern 1: Match unescaped broken references: ![filename.csv](url)
-        pattern1 = r'(?<!\\)!\[([^\]]+\.csv[^\]]*)\]\(([^\)]+)\)'
-        
-        # Pattern 2: Match escaped broken references: \![filename.csv](url)
-        # (where ! is escaped but brackets/parens are not)
-        pattern2 = r'\\!\[([^\]]+\.csv[^\]]*)\]\(([^\)]+)\)'
-        
-        # Pattern 3: Match fully escaped markdown: \!\[filename\.csv\]\(url\)
-        # This handles cases where all markdown syntax is escaped
-        # Match: backslash-exclamation-backslash-bracket, then filename with .csv, 
-        # then backslash-bracket-backslash-paren, then URL, then backslash-paren
-        # Use a more flexible pattern that allows escaped chars in filename/URL
-        pattern3 = r'\\!\\\[(.*?\.csv.*?)\\\]\\\((.*?)\\\)'
-
-        # Check for unescaped broken references
-        matches = re.finditer(pattern1, text)
-        for match in matches:
-            filename = match.group(1)
-            url = match.group(2)
-            broken_pattern = match.group(0)
-            fixed_pattern = f"[{filename}]({url})"
-            broken_refs.append((broken_pattern, fixed_pattern))
-
-        # Check for escaped ! but unescaped brackets
-        matches = re.finditer(pattern2, text)
-        for match in matches:
-            filename = match.group(1)
-            url = match.group(2)
-            broken_pattern = match.group(0)  # Includes the backslash before !
-            fixed_pattern = f"[{filename}]({url})"
-            broken_refs.append((broken_pattern, fixed_pattern))
-
-        # Check for fully escaped markdown (all syntax escaped)
-        matches = re.finditer(pattern3, text)
-        for match in matches:
-            # The filename and URL have escaped characters that need to be unescaped
-            filename_raw = match.group(1)
-            url_raw = match.group(2)
-            # Unescape common escaped characters in filename
-            # Order matters: do \\\\ first, then other escapes
-            filename = filename_raw.replace('\\\\', '\\').replace('\\_', '_').replace('\\(', '(').replace('\\)', ')').replace('\\.', '.')
-            # Unescape URL - handle all escaped characters including those in the path
-            url = url_raw.replace('\\\\', '\\').replace('\\_', '_').replace('\\(', '(').replace('\\)', ')').replace('\\.', '.').replace('\\/', '/')
-            broken_pattern = match.group(0)  # Full escaped pattern
-            fixed_pattern = f"[{filename}]({url})"
-            broken_refs.append((broken_pattern, fixed_pattern))
+        for match in _BROKEN_CSV_REF.finditer(text):
+            # Broken pattern includes any backslash before the !
+            broken_refs.append((match.group(0), _fixed_reference(match)))
 
         return broken_refs
 
@@ -105,108 +180,106 @@ class CSVFixer:
         Returns:
             Fixed text if changes were made, None otherwise
         """
-        if not text:
-            return None
+        return CSVFixer.fix_text_with_count(text)[0]
 
-        broken_refs = CSVFixer.find_broken_csv_references(text)
-        if not broken_refs:
-            return None
+    @staticmethod
+    def fix_text_with_count(text: Optional[str]) -> Tuple[Optional[str], int]:
+        """
+        Fix broken CSV references in text and report how many were fixed.
 
-        fixed_text = text
-        for broken, fixed in broken_refs:
-            fixed_text = fixed_text.replace(broken, fixed)
+        Args:
+            text: Text that may contain broken CSV references
 
-        return fixed_text if fixed_text != text else None
+        Returns:
+            Tuple of (fixed text if changes were made or None, number of references fixed)
+        """
+        if not text:
+            return None, 0
+
+        return _fix_text_cached(text)
 
     @staticmethod
-    def analyze_test_case(test_case: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_test_case(
+        test_case: Dict[str, Any],
+        counts: Optional[Dict[str, int]] = None
+    ) -> Dict[str, Any]:
         """
         Analyze a test case and return fields that need to be updated.
 
         Args:
             test_case: Test case dictionary from the API
+            counts: Optional dictionary that receives the number of broken references
+                    found per field (description, preconditions, postconditions, steps, custom)
 
         Returns:
             Dictionary with only the fields that need fixing
         """
         updates = {}
-
-        # Check description
-        description = test_case.get("description")
-        fixed_description = CSVFixer.fix_text(description)
-        if fixed_description:
-            updates["description"] = fixed_description
-
-        # Check preconditions
-        preconditions = test_case.get("preconditions")
-        fixed_preconditions = CSVFixer.fix_text(preconditions)
-        if fixed_preconditions:
-            updates["preconditions"] = fixed_preconditions
-
-        # Check postconditions
-        postconditions = test_case.get("postconditions")
-        fixed_postconditions = CSVFixer.fix_text(postconditions)
-        if fixed_postconditions:
-            updates["postconditions"] = fixed_postconditions
+        if counts is None:
+            counts = {}
+        counts["steps"] = 0
+        counts["custom"] = 0
+
+        # Bind hot lookups to locals once per case. Non-empty values go straight
+        # to the cached fixer, skipping the fix_text_with_count frame per field.
+        fix = _fix_text_cached
+        no_fix = (None, 0)
+        get = test_case.get
+
+        # Check description, preconditions and postconditions
+        for key in _CASE_TEXT_FIELDS:
+            value = get(key)
+            fixed_value, counts[key] = fix(value) if value else no_fix
+            if fixed_value:
+                updates[key] = fixed_value
 
         # Check steps
-        steps = test_case.get("steps", [])
+        steps = get("steps", [])
         if steps:
-            fixed_steps = []
-            steps_need_update = False
-
-            for step in steps:
-                # Build the step update object with only fields that need to be sent
-                fixed_step = {}
-                step_updated = False
-
-                # Include position (required for step identification)
-                if "position" in step:
-                    fixed_step["position"] = step["position"]
-                
-                # Include hash if it exists (may be required for step updates)
-                if "hash" in step:
-                    fixed_step["hash"] = step["hash"]
-
-                # Check action field
-                action = step.get("action")
-                fixed_action = CSVFixer.fix_text(action)
-                if fixed_action:
-                    fixed_step["action"] = fixed_action
-                    step_updated = True
-                elif action is not None:
-                    fixed_step["action"] = action
-
-                # Check expected_result field
-                expected_result = step.get("expected_result")
-                fixed_expected_result = CSVFixer.fix_text(expected_result)
-                if fixed_expected_result:
-                    fixed_step["expected_result"] = fixed_expected_result
-                    step_updated = True
-                elif expected_result is not None:
-                    fixed_step["expected_result"] = expected_result
-
-                # Check data field
-                data = step.get("data")
-                fixed_data = CSVFixer.fix_text(data)
-                if fixed_data:
-                    fixed_step["data"] = fixed_data
-                    step_updated = True
-                elif data is not None:
-                    fixed_step["data"] = data
-
-                if step_updated:
-                    steps_need_update = True
-
-                # Always include the step in the array to maintain structure
-                fixed_steps.append(fixed_step)
-
-            if steps_need_update:
+            # Fixed values per step index. The update payload is only built if
+            # at least one step changed, which most test cases never need.
+            step_fixes = {}
+
+            for index, step in enumerate(steps):
+                # Check action, expected_result and data fields
+                step_get = step.get
+                for key in _STEP_TEXT_FIELDS:
+                    value = step_get(key)
+                    fixed_value, count = fix(value) if value else no_fix
+                    if fixed_value:
+                        counts["steps"] += count
+                        step_fixes.setdefault(index, {})[key] = fixed_value
+
+            if step_fixes:
+                fixed_steps = []
+                for index, step in enumerate(steps):
+                    # Build the step update object with only fields that need to be sent
+                    fixed_step = {}
+
+                    # Include position (required for step identification)
+                    if "position" in step:
+                        fixed_step["position"] = step["position"]
+
+                    # Include hash if it exists (may be required for step updates)
+                    if "hash" in step:
+                        fixed_step["hash"] = step["hash"]
+
+                    # The API replaces the whole steps array, so unchanged fields
+                    # are sent through as they are
+                    fixed_fields = step_fixes.get(index, {})
+                    for key in _STEP_TEXT_FIELDS:
+                        value = fixed_fields.get(key) or step.get(key)
+                        if value is not None:
+                            fixed_step[key] = value
+
+                    # Always include the step in the array to maintain structure
+                    fixed_steps.append(fixed_step)
+
                 updates["steps"] = fixed_steps
 
         # Check custom_fields
         # Note: API expects "custom_field" (singular) as an object with field IDs as keys
-        custom_fields = test_case.get("custom_fields", [])
+        custom_fields = get("custom_fields", [])
         if custom_fields:
             custom_field_updates = {}
             custom_fields_need_update = False
@@ -214,7 +287,8 @@ class CSVFixer:
             for field in custom_fields:
                 field_id = field.get("id")
                 value = field.get("value")
-                fixed_value = CSVFixer.fix_text(value)
+                fixed_value, count = fix(value) if value else no_fix
+                counts["custom"] += count
                 if fixed_value and field_id is not None:
                     # API expects field ID as string key
                     custom_field_updates[str(field_id)] = fixed_value
@@ -242,54 +316,58 @@ class CSVFixer:
         if not self.api:
             raise ValueError("API token and project code must be provided during initialization for migration")
 
-        test_cases = self.api.get_all_test_cases()
         stats = {
-            "total": len(test_cases),
+            "total": 0,
             "needs_fixing": 0,
             "fixed": 0,
             "errors": 0
         }
 
-        print(f"\nAnalyzing {stats['total']} test cases...")
-
-        for test_case in test_cases:
-            case_id = test_case.get("id")
-            title = test_case.get("title", "Untitled")
-
-            updates = self.analyze_test_case(test_case)
-
-            if verbose:
-                # Show what fields were checked and if they have broken refs
-                desc = test_case.get("description", "")
-                prec = test_case.get("preconditions", "")
-                postc = test_case.get("postconditions", "")
-                steps = test_case.get("steps", [])
-                custom = test_case.get("custom_fields", [])
-                
-                desc_broken = self.find_broken_csv_references(desc)
-                prec_broken = self.find_broken_csv_references(prec)
-                postc_broken = self.find_broken_csv_references(postc)
-                steps_broken = sum(len(self.find_broken_csv_references(s.get("action", "") or s.get("expected_result", "") or s.get("data", ""))) for s in steps)
-                custom_broken = sum(len(self.find_broken_csv_references(f.get("value", ""))) for f in custom)
-                
-                print(f"Case {case_id} ('{title}'): desc={len(desc_broken)}, prec={len(prec_broken)}, postc={len(postc_broken)}, steps={steps_broken}, custom={custom_broken}")
-
-            if updates:
-                stats["needs_fixing"] += 1
-                print(f"\nCase {case_id} ('{title}') needs fixing:")
-                print(f"  Fields to update: {list(updates.keys())}")
-
-                if not dry_run:
-                    if self.api.update_test_case(case_id, updates):
-                        stats["fixed"] += 1
-                        print(f"  ✓ Successfully updated case {case_id}")
+        print("\nAnalyzing test cases as they are fetched...")
+
+        # Cases are analyzed page by page as they stream in; the blocking PATCH
+        # requests go to the pool so several are in flight at once
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            future_to_case = {}
+
+            for test_case in self.api.iter_test_cases():
+                stats["total"] += 1
+                case_id = test_case.get("id")
+                title = test_case.get("title", "Untitled")
+
+                # Broken reference counts per field, collected during analysis
+                # and only needed for the verbose report
+                counts = {} if verbose else None
+                updates = self.analyze_test_case(test_case, counts)
+
+                if verbose:
+                    # Show what fields were checked and if they have broken refs
+                    print(f"Case {case_id} ('{title}'): desc={counts['description']}, prec={counts['preconditions']}, "
+                          f"postc={counts['postconditions']}, steps={counts['steps']}, custom={counts['custom']}")
+
+                if updates:
+                    stats["needs_fixing"] += 1
+                    print(f"\nCase {case_id} ('{title}') needs fixing:")
+                    print(f"  Fields to update: {list(updates.keys())}")
+
+                    if not dry_run:
+                        future = executor.submit(self.api.update_test_case, case_id, updates)
+                        future_to_case[future] = case_id
                     else:
-                        stats["errors"] += 1
-                        print(f"  ✗ Failed to update case {case_id}")
+                        print(f"  [DRY RUN] Would update with: {json.dumps(updates, indent=2)}")
+                        stats["fixed"] += 1  # Count as would-be fixed in dry run
+
+            # Collect update results as they complete
+            for future in as_completed(future_to_case):
+                case_id = future_to_case[future]
+                if future.result():
+                    stats["fixed"] += 1
+                    print(f"  ✓ Successfully updated case {case_id}")
                 else:
-                    print(f"  [DRY RUN] Would update with: {json.dumps(updates, indent=2)}")
-                    stats["fixed"] += 1  # Count as would-be fixed in dry run
+                    stats["errors"] += 1
+                    print(f"  ✗ Failed to update case {case_id}")
 
+        print(f"\nAnalyzed {stats['total']} test cases")
         return stats
 
     def run(self, dry_run: bool = False, verbose: bool = False):
@@ -314,46 +392,19 @@ class CSVFixer:
 
         stats = self.process_all_cases(dry_run=dry_run, verbose=verbose)
 
-        print("\n" + "=" * 60)
-        print("Summary:")
-        print(f"  Total test cases: {stats['total']}")
-        print(f"  Cases needing fixes: {stats['needs_fixing']}")
-        print(f"  Cases fixed: {stats['fixed']}")
-        print(f"  Errors: {stats['errors']}")
+        # Build the summary first and write it in one go
+        summary = [
+            "\n" + "=" * 60,
+            "Summary:",
+            f"  Total test cases: {stats['total']}",
+            f"  Cases needing fixes: {stats['needs_fixing']}",
+            f"  Cases fixed: {stats['fixed']}",
+            f"  Errors: {stats['errors']}"
+        ]
         if stats['needs_fixing'] == 0 and stats['total'] > 0:
-            print("\n  [INFO] All test cases are already fixed! No broken CSV references found.")
-        print("=" * 60)
-
-
-def load_config(config_path: str = "config.json") -> Dict[str, str]:
-    """
-    Load configuration from a JSON file.
-
-    Args:
-        config_path: Path to the config file
-
-    Returns:
-        Dictionary with configuration values
-
-    Raises:
-        FileNotFoundError: If config file doesn't exist
-        ValueError: If config file is invalid or missing required fields
-    """
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(
-            f"Config file '{config_path}' not found. "
-            f"Please create it with 'api_token' and 'project_code' fields."
-        )
-
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-
-    if "api_token" not in config:
-        raise ValueError("Config file must contain 'api_token' field")
-    if "project_code" not in config:
-        raise ValueError("Config file must contain 'project_code' field")
-
-    return config
+            summary.append("\n  [INFO] All test cases are already fixed! No broken CSV references found.")
+        summary.append("=" * 60)
+        print("\n".join(summary))
 
 
 def main():
@@ -385,6 +436,12 @@ def main():
         action="store_true",
         help="Show detailed information about each test case"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of concurrent workers for sending updates (default: 8)"
+    )
 
     args = parser.parse_args()
 
@@ -394,7 +451,7 @@ def main():
 
     if not api_token or not project_code:
         try:
-            config = load_config(args.config)
+            config = load_project_config(args.config)
             api_token = api_token or config.get("api_token")
             project_code = project_code or config.get("project_code")
         except (FileNotFoundError, ValueError) as e:
@@ -411,7 +468,8 @@ def main():
 
     fixer = CSVFixer(
         api_token=api_token,
-        project_code=project_code
+        project_code=project_code,
+        num_workers=args.workers
     )
 
     fixer.run(dry_run=args.dry_run, verbose=args.verbose)
@@ -6,174 +6,489 @@ This script deletes all attachments from a Qase workspace that match a specific
 It reads the API token from config.json and uses multiple workers for parallel deletion.
 """
 
-import json
-import os
+import asyncio
 import sys
+import threading
+import time
 import requests
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
 
+from qase_common import QaseClient, json_loads, load_config
 
-# Thread-safe counter for progress tracking
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Deletion throttling. DELETEs are sent in chunks of CHUNK_SIZE; each chunk
+# is drained before the next starts. MAX_RPS caps the average request rate
+# (0 disables the cap), and a chunk whose failure ratio exceeds
+# FAILURE_BACKOFF_RATIO is followed by a FAILURE_BACKOFF_SECONDS pause.
+CHUNK_SIZE = 500
+MAX_RPS = 0
+FAILURE_BACKOFF_RATIO = 0.1
+FAILURE_BACKOFF_SECONDS = 5.0
+
+# DELETEs that fail with a transient error are collected and retried after
+# the main pass by RETRY_WORKERS threads, with exponential backoff starting
+# at RETRY_BACKOFF_SECONDS, up to MAX_RETRY_ATTEMPTS times each.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_WORKERS = 3
+RETRY_BACKOFF_SECONDS = 0.5
+MAX_RETRY_ATTEMPTS = 5
+
+# Seconds between progress line refreshes
+PROGRESS_INTERVAL = 0.25
+
+
+class RetryableDeleteError(Exception):
+    """Raised when a DELETE failed in a way that may succeed if retried."""
+
+    def __init__(self, attachment_hash: str, reason: str):
+        super().__init__(f"{attachment_hash}: {reason}")
+        self.attachment_hash = attachment_hash
+        self.reason = reason
+
+
+# Progress tally. Only the main thread updates it (from completed futures or
+# tasks), so no lock is needed on the worker hot path.
 class ProgressCounter:
     def __init__(self):
-        self.lock = Lock()
         self.deleted = 0
         self.failed = 0
         self.total = 0
 
     def increment_deleted(self):
-        with self.lock:
-            self.deleted += 1
+        self.deleted += 1
 
     def increment_failed(self):
-        with self.lock:
-            self.failed += 1
+        self.failed += 1
 
     def get_progress(self):
-        with self.lock:
-            return self.deleted, self.failed, self.total
+        return self.deleted, self.failed, self.total
 
 
-def load_config(config_path: str = "config.json") -> Dict[str, Any]:
-    """
-    Load configuration from a JSON file.
+class AttachmentClient(QaseClient):
+    """Workspace client for listing and deleting attachments."""
 
-    Args:
-        config_path: Path to the config file
+    def __init__(self, api_token: str, pool_size: int = 32):
+        """
+        Initialize the client.
+
+        Args:
+            api_token: Qase API token
+            pool_size: Maximum number of pooled connections to the API host
+        """
+        super().__init__(api_token, pool_size)
+        self.attachment_url = f"{self.base_url}/attachment"
+
+    def _probe_size_filter(self, limit: int, size: int) -> Optional[Dict[str, Any]]:
+        """
+        Request the first page with a server-side size filter.
+
+        Args:
+            limit: Page size
+            size: Attachment size in bytes to filter on
+
+        Returns:
+            The first page's result dictionary if the server applied the filter,
+            or None if it rejected or ignored it
+        """
+        params = {"limit": limit, "offset": 0, "filter[size]": size}
+
+        try:
+            response = self.session.get(self.attachment_url, params=params)
+            if response.status_code == 400:
+                return None
+            response.raise_for_status()
+            data = json_loads(response.content)
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+
+        if not data.get("status"):
+            return None
+
+        result = data.get("result", {})
+        # An API that ignores unknown parameters returns unfiltered entities
+        if any(att.get("size") != size for att in result.get("entities", [])):
+            return None
+
+        return result
+
+    def list_attachments(
+        self,
+        max_workers: int = 16,
+        size: Optional[int] = None,
+        stats: Optional[Dict[str, int]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over all attachments in the workspace, page by page.
+
+        Args:
+            max_workers: Number of pages to fetch in parallel
+            size: If given, ask the API to return only attachments of this size.
+                Falls back to the full listing when the filter is not supported,
+                so callers must still check the size themselves.
+            stats: Optional dictionary that receives "total", the number of
+                attachments in the workspace, when the server-side filter is
+                used and the caller therefore doesn't see them all
+
+        Yields:
+            Attachment dictionaries
+        """
+        limit = 100
+        extra_params = None
+        first_page = None
+
+        print("Fetching attachments from workspace...")
+
+        if size is not None:
+            first_page = self._probe_size_filter(limit, size)
+            if first_page is not None:
+                extra_params = {"filter[size]": size}
+                print(f"Using server-side filter for size {size}")
+                if stats is not None:
+                    unfiltered = self.fetch_page(self.attachment_url, 0, 1, "attachments")
+                    stats["total"] = unfiltered.get("total", 0) if unfiltered else 0
+            else:
+                print("Server-side size filter not supported; filtering locally")
+
+        yield from self.iter_paginated(
+            self.attachment_url,
+            label="attachments",
+            page_size=limit,
+            max_workers=max_workers,
+            extra_params=extra_params,
+            first_page=first_page
+        )
+
+    def delete_attachment(self, attachment_hash: str) -> bool:
+        """
+        Delete an attachment by hash.
+
+        Args:
+            attachment_hash: Hash of the attachment to delete
+
+        Returns:
+            True if deletion was successful, False otherwise
+
+        Raises:
+            RetryableDeleteError: If the request failed with a transient error
+                (connection problem, rate limit or server error)
+        """
+        url = f"{self.attachment_url}/{attachment_hash}"
+
+        try:
+            self.delete(url)
+            return True
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+                requests.exceptions.RetryError) as e:
+            raise RetryableDeleteError(attachment_hash, str(e)) from e
+        except requests.exceptions.RequestException as e:
+            if e.response is not None and e.response.status_code in RETRYABLE_STATUS_CODES:
+                raise RetryableDeleteError(attachment_hash, str(e)) from e
+            print(f"\nError deleting attachment {attachment_hash}: {e}")
+            if hasattr(e, 'response') and e.response is not None:
+                print(f"Response: {e.response.text}")
+            return False
 
+
+def delete_attachment_worker(args: tuple) -> tuple:
+    """
+    Worker function for deleting a single attachment.
+    
+    Args:
+        args: Tuple of (client, attachment_hash, attachment_info)
+    
     Returns:
-        Dictionary with configuration values
+        Tuple of (attachment_hash, success)
 
     Raises:
-        FileNotFoundError: If config file doesn't exist
-        ValueError: If config file is invalid or missing required fields
+        RetryableDeleteError: If the deletion should be retried later
     """
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(
-            f"Config file '{config_path}' not found. "
-            f"Please create it with 'api_token' field."
-        )
+    client, attachment_hash, attachment_info = args
+    return attachment_hash, client.delete_attachment(attachment_hash)
+
 
-    with open(config_path, 'r') as f:
-        config = json.load(f)
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    """Yield successive slices of at most size items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
-    if "api_token" not in config:
-        raise ValueError("Config file must contain 'api_token' field")
 
-    if not config.get("api_token"):
-        raise ValueError("API token is empty in config file")
+def _chunk_pause(chunk_size: int, elapsed: float, failures: int) -> float:
+    """
+    Work out how long to wait before starting the next chunk.
+
+    Args:
+        chunk_size: Number of DELETEs in the chunk that just finished
+        elapsed: Seconds the chunk took
+        failures: Number of DELETEs in the chunk that failed
 
-    return config
+    Returns:
+        Seconds to sleep (0 if the next chunk can start immediately)
+    """
+    pause = 0.0
+    if MAX_RPS:
+        pause = chunk_size / MAX_RPS - elapsed
+    if failures > chunk_size * FAILURE_BACKOFF_RATIO:
+        print(f"\n{failures}/{chunk_size} deletions failed in the last chunk; "
+              f"backing off for {FAILURE_BACKOFF_SECONDS:g}s")
+        pause = max(pause, FAILURE_BACKOFF_SECONDS)
+    return max(pause, 0.0)
+
+
+def delete_all_threaded(
+    client: AttachmentClient,
+    attachments: List[Dict[str, Any]],
+    counter: ProgressCounter,
+    num_workers: int = 10
+) -> List[str]:
+    """
+    Delete attachments chunk by chunk with a thread pool.
 
+    Args:
+        client: Qase API client
+        attachments: Attachments to delete
+        counter: Progress counter updated as deletions complete
+        num_workers: Number of worker threads
 
-def get_all_attachments(api_token: str) -> List[Dict[str, Any]]:
+    Returns:
+        Hashes of attachments that failed transiently and should be retried
+    """
+    retry_queue = []
+
+    # Pause before the next chunk, as worked out after the previous one
+    pause = 0.0
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for chunk in _chunks(attachments, CHUNK_SIZE):
+            if pause:
+                time.sleep(pause)
+
+            started = time.monotonic()
+            failures = 0
+
+            # Submit this chunk's deletion tasks
+            future_to_hash = {
+                executor.submit(
+                    delete_attachment_worker, (client, att.get("hash"), att)
+                ): att.get("hash")
+                for att in chunk
+            }
+
+            # Drain the chunk and show progress
+            for future in as_completed(future_to_hash):
+                try:
+                    attachment_hash, success = future.result()
+                except RetryableDeleteError as e:
+                    retry_queue.append(e.attachment_hash)
+                    failures += 1
+                    continue
+
+                if success:
+                    counter.increment_deleted()
+                else:
+                    counter.increment_failed()
+                    failures += 1
+
+            pause = _chunk_pause(len(chunk), time.monotonic() - started, failures)
+
+    return retry_queue
+
+
+async def delete_attachment_async(
+    session: "aiohttp.ClientSession",
+    semaphore: asyncio.Semaphore,
+    attachment_url: str,
+    attachment_hash: str
+) -> Tuple[str, bool]:
     """
-    Fetch all attachments from the workspace using pagination.
+    Delete an attachment by hash on the event loop.
 
     Args:
-        api_token: Qase API token
+        session: aiohttp session with auth headers set
+        semaphore: Semaphore bounding the number of in-flight requests
+        attachment_url: Base URL of the attachment endpoint
+        attachment_hash: Hash of the attachment to delete
 
     Returns:
-        List of attachment dictionaries
+        Tuple of (attachment_hash, success)
+
+    Raises:
+        RetryableDeleteError: If the request failed with a transient error
+    """
+    url = f"{attachment_url}/{attachment_hash}"
+
+    async with semaphore:
+        try:
+            async with session.delete(url) as response:
+                if response.status in RETRYABLE_STATUS_CODES:
+                    raise RetryableDeleteError(attachment_hash, f"HTTP {response.status}")
+                if response.status >= 400:
+                    print(f"\nError deleting attachment {attachment_hash}: HTTP {response.status}")
+                    print(f"Response: {await response.text()}")
+                    return attachment_hash, False
+                return attachment_hash, True
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            raise RetryableDeleteError(attachment_hash, str(e) or type(e).__name__) from e
+        except aiohttp.ClientError as e:
+            print(f"\nError deleting attachment {attachment_hash}: {e}")
+            return attachment_hash, False
+
+
+async def delete_all(
+    client: AttachmentClient,
+    hashes: List[str],
+    counter: ProgressCounter,
+    concurrency: int = 100
+) -> List[str]:
     """
-    all_attachments = []
-    offset = 0
-    limit = 100
-    base_url = "https://api.qase.io/v1"
+    Delete attachments chunk by chunk with aiohttp.
+
+    Args:
+        client: Qase API client providing the token and endpoint URL
+        hashes: Hashes of the attachments to delete
+        counter: Progress counter updated as deletions complete
+        concurrency: Maximum number of in-flight DELETE requests
+
+    Returns:
+        Hashes of attachments that failed transiently and should be retried
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=concurrency,
+        ttl_dns_cache=300,
+        keepalive_timeout=60
+    )
     headers = {
-        "Token": api_token,
+        "Token": client.api_token,
         "accept": "application/json"
     }
 
-    print("Fetching attachments from workspace...")
+    retry_queue = []
 
-    while True:
-        url = f"{base_url}/attachment"
-        params = {"limit": limit, "offset": offset}
+    # Pause before the next chunk, as worked out after the previous one
+    pause = 0.0
 
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+        for chunk in _chunks(hashes, CHUNK_SIZE):
+            if pause:
+                await asyncio.sleep(pause)
 
-            if not data.get("status"):
-                print(f"Error: API returned status false")
-                break
+            started = time.monotonic()
+            failures = 0
+            tasks = [
+                asyncio.ensure_future(
+                    delete_attachment_async(session, semaphore, client.attachment_url, attachment_hash)
+                )
+                for attachment_hash in chunk
+            ]
 
-            result = data.get("result", {})
-            entities = result.get("entities", [])
-            total = result.get("total", 0)
-            count = result.get("count", 0)
+            for task in asyncio.as_completed(tasks):
+                try:
+                    attachment_hash, success = await task
+                except RetryableDeleteError as e:
+                    retry_queue.append(e.attachment_hash)
+                    failures += 1
+                    continue
 
-            all_attachments.extend(entities)
-            print(f"Fetched {len(entities)} attachments (offset: {offset}, total: {total})")
+                if success:
+                    counter.increment_deleted()
+                else:
+                    counter.increment_failed()
+                    failures += 1
 
-            # Check if we've fetched all attachments
-            if offset + count >= total or len(entities) == 0:
-                break
+            pause = _chunk_pause(len(chunk), time.monotonic() - started, failures)
 
-            offset += count
+    return retry_queue
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching attachments: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response: {e.response.text}")
+
+def _retry_delete(client: AttachmentClient, attachment_hash: str) -> bool:
+    """
+    Retry a transiently failed deletion with exponential backoff.
+
+    Args:
+        client: Qase API client
+        attachment_hash: Hash of the attachment to delete
+
+    Returns:
+        True if the attachment was eventually deleted, False otherwise
+    """
+    success = False
+    last_error = None
+    for attempt in range(MAX_RETRY_ATTEMPTS):
+        time.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+        try:
+            success = client.delete_attachment(attachment_hash)
             break
+        except RetryableDeleteError as e:
+            last_error = e.reason
+    else:
+        print(f"\nError deleting attachment {attachment_hash} after "
+              f"{MAX_RETRY_ATTEMPTS} retries: {last_error}")
 
-    print(f"Total attachments fetched: {len(all_attachments)}")
-    return all_attachments
+    return success
 
 
-def delete_attachment(api_token: str, attachment_hash: str) -> bool:
+def retry_failed_deletions(
+    client: AttachmentClient,
+    hashes: List[str],
+    counter: ProgressCounter
+) -> None:
     """
-    Delete an attachment by hash.
+    Retry transiently failed deletions with a small thread pool.
 
     Args:
-        api_token: Qase API token
-        attachment_hash: Hash of the attachment to delete
+        client: Qase API client
+        hashes: Hashes of the attachments to retry
+        counter: Progress counter updated as retries complete
+    """
+    print(f"\n\nRetrying {len(hashes)} attachment(s) that failed transiently...")
 
-    Returns:
-        True if deletion was successful, False otherwise
+    with ThreadPoolExecutor(max_workers=RETRY_WORKERS) as executor:
+        futures = [
+            executor.submit(_retry_delete, client, attachment_hash)
+            for attachment_hash in hashes
+        ]
+
+        for future in as_completed(futures):
+            if future.result():
+                counter.increment_deleted()
+            else:
+                counter.increment_failed()
+
+
+def print_progress(counter: ProgressCounter) -> None:
     """
-    base_url = "https://api.qase.io/v1"
-    url = f"{base_url}/attachment/{attachment_hash}"
-    headers = {
-        "Token": api_token,
-        "accept": "application/json"
-    }
+    Print the deletion progress line.
 
-    try:
-        response = requests.delete(url, headers=headers)
-        response.raise_for_status()
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"\nError deleting attachment {attachment_hash}: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"Response: {e.response.text}")
-        return False
+    Args:
+        counter: Progress counter holding the deleted/failed totals
+    """
+    deleted, failed, total = counter.get_progress()
+    completed = deleted + failed
+    progress_pct = (completed / total) * 100
 
+    sys.stdout.write(f"\rProgress: {completed}/{total} ({progress_pct:.1f}%) | "
+                     f"Deleted: {deleted}, Failed: {failed}")
+    sys.stdout.flush()
 
-def delete_attachment_worker(args: tuple) -> tuple:
+
+def _progress_printer(counter: ProgressCounter, stop_event: threading.Event) -> None:
     """
-    Worker function for deleting a single attachment.
-    
+    Refresh the progress line every PROGRESS_INTERVAL seconds until stopped.
+
     Args:
-        args: Tuple of (api_token, attachment_hash, attachment_info, counter)
-    
-    Returns:
-        Tuple of (attachment_hash, success)
+        counter: Progress counter holding the deleted/failed totals
+        stop_event: Event set once all deletions have finished
     """
-    api_token, attachment_hash, attachment_info, counter = args
-    success = delete_attachment(api_token, attachment_hash)
-    
-    if success:
-        counter.increment_deleted()
-    else:
-        counter.increment_failed()
-    
-    return attachment_hash, success
+    while not stop_event.wait(PROGRESS_INTERVAL):
+        print_progress(counter)
+    print_progress(counter)
 
 
 def main():
@@ -186,6 +501,7 @@ def main():
     # Configuration
     TARGET_SIZE = 157010
     NUM_WORKERS = 10
+    ASYNC_CONCURRENCY = 100
 
     # Load config
     try:
@@ -195,29 +511,33 @@ def main():
         print(f"Error loading config: {e}")
         sys.exit(1)
 
-    # Get all attachments
-    all_attachments = get_all_attachments(api_token)
+    # Share one pooled session across the listing and all delete workers
+    client = AttachmentClient(api_token)
 
-    if not all_attachments:
-        print("\nNo attachments found.")
-        return
+    # Filter attachments by size as the pages arrive
+    listed_count = 0
+    listing_stats = {}
+    matching_attachments = []
+    append_match = matching_attachments.append
+    for listed_count, att in enumerate(client.list_attachments(size=TARGET_SIZE, stats=listing_stats), 1):
+        if att.get("size") == TARGET_SIZE:
+            append_match(att)
 
-    # Filter attachments by size
-    matching_attachments = [
-        att for att in all_attachments
-        if att.get("size") == TARGET_SIZE
-    ]
+    # With the server-side filter only matches are listed, so the number
+    # checked is the workspace total reported by the API
+    checked_count = listing_stats.get("total", listed_count)
 
     if not matching_attachments:
-        print(f"\nNo attachments found with size {TARGET_SIZE}.")
-        print(f"Total attachments checked: {len(all_attachments)}")
+        if not checked_count:
+            print("\nNo attachments found.")
+        else:
+            print(f"\nNo attachments found with size {TARGET_SIZE}.")
+            print(f"Total attachments checked: {checked_count}")
         return
 
     print(f"\nFound {len(matching_attachments)} attachment(s) with size {TARGET_SIZE}:")
     for att in matching_attachments[:10]:  # Show first 10
-        att_hash = att.get("hash")
-        att_file = att.get("file", "Unknown")
-        att_size = att.get("size")
+        att_hash, att_file, att_size = att.get("hash"), att.get("file", "Unknown"), att.get("size")
         print(f"  - Hash: {att_hash[:16]}..., File: {att_file}, Size: {att_size}")
     
     if len(matching_attachments) > 10:
@@ -230,43 +550,36 @@ def main():
         print("Deletion cancelled.")
         return
 
-    print(f"\nDeleting attachments using {NUM_WORKERS} workers...")
-    print()
-
     # Initialize progress counter
     counter = ProgressCounter()
     counter.total = len(matching_attachments)
 
-    # Prepare arguments for workers
-    worker_args = [
-        (api_token, att.get("hash"), att, counter)
-        for att in matching_attachments
-    ]
-
-    # Delete attachments in parallel
-    deleted_count = 0
-    failed_count = 0
-    completed = 0
-
-    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-        # Submit all deletion tasks
-        future_to_hash = {
-            executor.submit(delete_attachment_worker, args): args[1]
-            for args in worker_args
-        }
-
-        # Process completed tasks and show progress
-        for future in as_completed(future_to_hash):
-            completed += 1
-            attachment_hash, success = future.result()
-            
-            deleted, failed, total = counter.get_progress()
-            progress_pct = (completed / total) * 100
-            
-            # Show progress every 10 completions or at the end
-            if completed % 10 == 0 or completed == total:
-                print(f"\rProgress: {completed}/{total} ({progress_pct:.1f}%) | "
-                      f"Deleted: {deleted}, Failed: {failed}", end="", flush=True)
+    if aiohttp is not None:
+        # Event-loop fan-out keeps far more DELETEs in flight than threads
+        workers_used = ASYNC_CONCURRENCY
+        print(f"\nDeleting attachments using {ASYNC_CONCURRENCY} concurrent requests...")
+    else:
+        workers_used = NUM_WORKERS
+        print(f"\nDeleting attachments using {NUM_WORKERS} workers...")
+    print()
+
+    # Progress is printed from its own thread so the delete loops never block on stdout
+    stop_event = threading.Event()
+    printer = threading.Thread(target=_progress_printer, args=(counter, stop_event), daemon=True)
+    printer.start()
+
+    try:
+        if aiohttp is not None:
+            hashes = [att.get("hash") for att in matching_attachments]
+            retry_queue = asyncio.run(delete_all(client, hashes, counter, ASYNC_CONCURRENCY))
+        else:
+            retry_queue = delete_all_threaded(client, matching_attachments, counter, NUM_WORKERS)
+
+        if retry_queue:
+            retry_failed_deletions(client, retry_queue, counter)
+    finally:
+        stop_event.set()
+        printer.join()
 
     print()  # New line after progress
 
@@ -275,11 +588,11 @@ def main():
     
     print("\n" + "=" * 60)
     print("Summary:")
-    print(f"  Total attachments checked: {len(all_attachments)}")
+    print(f"  Total attachments checked: {checked_count}")
     print(f"  Attachments with size {TARGET_SIZE}: {len(matching_attachments)}")
     print(f"  Successfully deleted: {deleted}")
     print(f"  Failed: {failed}")
-    print(f"  Workers used: {NUM_WORKERS}")
+    print(f"  Workers used: {workers_used}")
     print("=" * 60)
 
 
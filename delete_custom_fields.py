@@ -6,130 +6,122 @@ This script deletes all custom fields from a Qase workspace.
 It reads the API token from config.json and removes all custom fields found.
 """
 
-import json
-import os
 import sys
+import time
 import requests
-from typing import Dict, List, Any
-
-
-def load_config(config_path: str = "config.json") -> Dict[str, Any]:
-    """
-    Load configuration from a JSON file.
-
-    Args:
-        config_path: Path to the config file
-
-    Returns:
-        Dictionary with configuration values
-
-    Raises:
-        FileNotFoundError: If config file doesn't exist
-        ValueError: If config file is invalid or missing required fields
-    """
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(
-            f"Config file '{config_path}' not found. "
-            f"Please create it with 'api_token' field."
-        )
-
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-
-    if "api_token" not in config:
-        raise ValueError("Config file must contain 'api_token' field")
-
-    if not config.get("api_token"):
-        raise ValueError("API token is empty in config file")
-
-    return config
+from typing import Dict, List, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from qase_common import QaseClient, load_config
+
+# The pooled session only retries GETs, so DELETEs rejected by the rate
+# limit or a transient server error are retried here, waiting as long as
+# Retry-After asks or else backing off exponentially from
+# RETRY_BACKOFF_SECONDS, up to MAX_RETRY_ATTEMPTS times.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF_SECONDS = 0.5
+MAX_RETRY_ATTEMPTS = 5
+
+
+class CustomFieldClient(QaseClient):
+    """Workspace client for listing and deleting custom fields."""
+
+    def __init__(self, api_token: str, pool_size: int = 32):
+        """
+        Initialize the client.
+
+        Args:
+            api_token: Qase API token
+            pool_size: Maximum number of pooled connections to the API host
+        """
+        super().__init__(api_token, pool_size)
+        self.custom_field_url = f"{self.base_url}/custom_field"
+
+    def list_custom_fields(self, max_workers: int = 16) -> List[Dict[str, Any]]:
+        """
+        Fetch all custom fields from the workspace using pagination.
+
+        Args:
+            max_workers: Number of pages to fetch in parallel
+
+        Returns:
+            List of custom field dictionaries
+        """
+        print("Fetching custom fields from workspace...")
+
+        return list(self.iter_paginated(
+            self.custom_field_url,
+            label="custom fields",
+            max_workers=max_workers
+        ))
+
+    def delete_custom_field(self, field_id: int) -> bool:
+        """
+        Delete a custom field by ID.
+
+        Args:
+            field_id: ID of the custom field to delete
+
+        Returns:
+            True if deletion was successful, False otherwise
+        """
+        url = f"{self.custom_field_url}/{field_id}"
+
+        for attempt in range(MAX_RETRY_ATTEMPTS + 1):
+            try:
+                self.delete(url)
+                return True
+            except requests.exceptions.RequestException as e:
+                response = getattr(e, 'response', None)
+                if (response is not None and response.status_code in RETRYABLE_STATUS_CODES
+                        and attempt < MAX_RETRY_ATTEMPTS):
+                    delay = _retry_delay(response, attempt)
+                    print(f"Deleting custom field {field_id} got HTTP {response.status_code}, "
+                          f"retrying in {delay:g}s")
+                    time.sleep(delay)
+                    continue
+                print(f"Error deleting custom field {field_id}: {e}")
+                if response is not None:
+                    print(f"Response: {response.text}")
+                return False
+        return False
 
 
-def get_all_custom_fields(api_token: str) -> List[Dict[str, Any]]:
+def _retry_delay(response: requests.Response, attempt: int) -> float:
     """
-    Fetch all custom fields from the workspace using pagination.
+    Work out how long to wait before retrying a failed request.
 
     Args:
-        api_token: Qase API token
+        response: Response with a retryable status
+        attempt: Zero-based number of the attempt that failed
 
     Returns:
-        List of custom field dictionaries
+        Number of seconds to wait, as asked by Retry-After when present
     """
-    all_fields = []
-    offset = 0
-    limit = 100
-    base_url = "https://api.qase.io/v1"
-    headers = {
-        "Token": api_token,
-        "accept": "application/json"
-    }
-
-    print("Fetching custom fields from workspace...")
-
-    while True:
-        url = f"{base_url}/custom_field"
-        params = {"limit": limit, "offset": offset}
-
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
         try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            # Retry-After may also be an HTTP date; fall back to the backoff
+            pass
+    return RETRY_BACKOFF_SECONDS * 2 ** attempt
 
-            if not data.get("status"):
-                print(f"Error: API returned status false")
-                break
 
-            result = data.get("result", {})
-            entities = result.get("entities", [])
-            total = result.get("total", 0)
-            count = result.get("count", 0)
-
-            all_fields.extend(entities)
-            print(f"Fetched {len(entities)} custom fields (offset: {offset}, total: {total})")
-
-            # Check if we've fetched all fields
-            if offset + count >= total or len(entities) == 0:
-                break
-
-            offset += count
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching custom fields: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response: {e.response.text}")
-            break
-
-    print(f"Total custom fields fetched: {len(all_fields)}")
-    return all_fields
-
-
-def delete_custom_field(api_token: str, field_id: int) -> bool:
+def _delete_worker(client: CustomFieldClient, field: Dict[str, Any]) -> Tuple[int, str, bool]:
     """
-    Delete a custom field by ID.
+    Worker function for deleting a single custom field.
 
     Args:
-        api_token: Qase API token
-        field_id: ID of the custom field to delete
+        client: Qase API client
+        field: Custom field dictionary from the API
 
     Returns:
-        True if deletion was successful, False otherwise
+        Tuple of (field_id, field_title, success)
     """
-    base_url = "https://api.qase.io/v1"
-    url = f"{base_url}/custom_field/{field_id}"
-    headers = {
-        "Token": api_token,
-        "accept": "application/json"
-    }
-
-    try:
-        response = requests.delete(url, headers=headers)
-        response.raise_for_status()
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"Error deleting custom field {field_id}: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"Response: {e.response.text}")
-        return False
+    field_id = field.get("id")
+    field_title = field.get("title", "Unknown")
+    return field_id, field_title, client.delete_custom_field(field_id)
 
 
 def main():
@@ -139,6 +131,9 @@ def main():
     print("=" * 60)
     print()
 
+    # Configuration
+    NUM_WORKERS = 10
+
     # Load config
     try:
         config = load_config()
@@ -147,8 +142,11 @@ def main():
         print(f"Error loading config: {e}")
         sys.exit(1)
 
+    # Share one pooled session across the listing and all delete workers
+    client = CustomFieldClient(api_token)
+
     # Get all custom fields
-    custom_fields = get_all_custom_fields(api_token)
+    custom_fields = client.list_custom_fields()
 
     if not custom_fields:
         print("\nNo custom fields found. Nothing to delete.")
@@ -167,24 +165,27 @@ def main():
         print("Deletion cancelled.")
         return
 
-    print("\nDeleting custom fields...")
+    print(f"\nDeleting custom fields using {NUM_WORKERS} workers...")
     print()
 
-    # Delete each custom field
+    # Delete custom fields in parallel
     deleted_count = 0
     failed_count = 0
 
-    for field in custom_fields:
-        field_id = field.get("id")
-        field_title = field.get("title", "Unknown")
-
-        print(f"Deleting custom field ID {field_id} ('{field_title}')...", end=" ")
-        if delete_custom_field(api_token, field_id):
-            print("✓ Success")
-            deleted_count += 1
-        else:
-            print("✗ Failed")
-            failed_count += 1
+    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
+        futures = [
+            executor.submit(_delete_worker, client, field)
+            for field in custom_fields
+        ]
+
+        for future in as_completed(futures):
+            field_id, field_title, success = future.result()
+            if success:
+                print(f"✓ Deleted custom field ID {field_id} ('{field_title}')")
+                deleted_count += 1
+            else:
+                print(f"✗ Failed to delete custom field ID {field_id} ('{field_title}')")
+                failed_count += 1
 
     # Summary
     print("\n" + "=" * 60)
@@ -14,12 +14,29 @@ This script:
 5. Updates the test cases via PATCH requests
 """
 
-import json
-import os
+import sys
+import time
 import argparse
-from typing import Dict, Optional, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Any, Tuple
 
-from qase_api import QaseAPI
+from qase_api import get_client
+from qase_common import load_project_config
+
+# How long fetched field definitions can be reused across runs with
+# --use-field-cache, in seconds
+FIELD_CACHE_TTL = 3600
+
+# Number of failed cases listed in the summary
+MAX_LISTED_FAILURES = 20
+
+# Minimum number of seconds between two progress bar redraws
+PROGRESS_INTERVAL = 0.05
+
+_PROGRESS_LINE = (
+    "\rProgress: [%s>%s] %.1f%% (%d/%d) | "
+    "Needs migration: %d, Migrated: %d, Errors: %d, Skipped: %d"
+)
 
 
 class QaseFieldMigration:
@@ -31,7 +48,9 @@ class QaseFieldMigration:
         project_code: str,
         source_field_name: str,
         destination_field_name: str,
-        destination_field_id: Optional[int] = None
+        destination_field_id: Optional[int] = None,
+        num_workers: int = 8,
+        use_field_cache: bool = False
     ):
         """
         Initialize the migration tool.
@@ -42,12 +61,28 @@ class QaseFieldMigration:
             source_field_name: Name of the source system field (e.g., 'Pre-conditions', 'Description')
             destination_field_name: Name of the destination custom field (e.g., 'Preconditions')
             destination_field_id: Optional custom field ID (if not provided, will search by name)
+            num_workers: Number of concurrent workers used to send updates
+            use_field_cache: If True, reuse field definitions cached on disk by an earlier run
+                             instead of fetching them
         """
-        self.api = QaseAPI(api_token, project_code)
+        self.api = get_client(
+            api_token,
+            project_code,
+            field_cache_ttl=FIELD_CACHE_TTL,
+            # Fresh definitions are always fetched unless asked otherwise, and
+            # still update the cache for later runs that opt in
+            refresh_field_cache=not use_field_cache
+        )
         self.source_field_name = source_field_name
         self.destination_field_name = destination_field_name
         self.destination_field_id = destination_field_id
         self.source_field_slug = None
+        self.num_workers = num_workers
+        self._last_progress_time = 0.0
+        # Intermediate redraws only need to reach the screen right away on a terminal
+        self._flush_progress = sys.stdout.isatty()
+        # (case ID, title) of every case whose update failed, listed in the summary
+        self.failed_cases: List[Tuple[int, str]] = []
 
     def find_source_field_slug(self) -> Optional[str]:
         """
@@ -104,11 +139,13 @@ class QaseFieldMigration:
         print(f"Warning: '{self.destination_field_name}' custom field not found!")
         return None
 
-    @staticmethod
-    def display_progress_bar(current: int, total: int, stats: Dict[str, int], bar_length: int = 40):
+    def display_progress_bar(self, current: int, total: int, stats: Dict[str, int], bar_length: int = 40):
         """
         Display a progress bar with percentage and statistics.
-        
+
+        Redraws are throttled to one every PROGRESS_INTERVAL seconds; the
+        final update (current == total) is always drawn and flushed.
+
         Args:
             current: Current progress count
             total: Total count
@@ -117,20 +154,34 @@ class QaseFieldMigration:
         """
         if total == 0:
             return
-        
-        percent = (current / total) * 100
-        filled_length = int(bar_length * current // total)
-        bar = '=' * filled_length + '>' + '-' * (bar_length - filled_length - 1)
-        
-        # Build stats string
-        stats_str = f"Needs migration: {stats['needs_migration']}, Migrated: {stats['migrated']}, Errors: {stats['errors']}, Skipped: {stats['skipped']}"
-        
+
+        now = time.monotonic()
+        if current != total and now - self._last_progress_time < PROGRESS_INTERVAL:
+            return
+        self._last_progress_time = now
+
+        filled_length = bar_length * current // total
+
         # Use \r to overwrite the same line
-        print(f'\rProgress: [{bar}] {percent:.1f}% ({current}/{total}) | {stats_str}', end='', flush=True)
-        
-        # If we're done, print a newline
+        sys.stdout.write(_PROGRESS_LINE % (
+            "=" * filled_length,
+            "-" * (bar_length - filled_length - 1),
+            current * 100 / total,
+            current,
+            total,
+            stats['needs_migration'],
+            stats['migrated'],
+            stats['errors'],
+            stats['skipped']
+        ))
+
+        # If we're done, print a newline. Redirected output (log files, CI)
+        # is left to the stream's own buffering until then.
         if current == total:
-            print()
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+        elif self._flush_progress:
+            sys.stdout.flush()
 
     def analyze_test_case(self, test_case: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -145,8 +196,9 @@ class QaseFieldMigration:
         # Get the system field value using the slug
         source_value = test_case.get(self.source_field_slug, "")
 
-        # If there's no content in source field, nothing to migrate
-        if not source_value or not source_value.strip():
+        # If there's no content in source field, nothing to migrate.
+        # isspace() answers the same question as strip() without copying the value.
+        if not source_value or source_value.isspace():
             return None
 
         # Prepare the update: copy to destination and clear source
@@ -196,9 +248,11 @@ class QaseFieldMigration:
                 "skipped": 0
             }
 
-        test_cases = self.api.get_all_test_cases()
+        # Cases are streamed page by page; only the total is needed up front
+        # to size the progress bar, and it comes with the first page
+        first_page = self.api.get_first_test_case_page()
         stats = {
-            "total": len(test_cases),
+            "total": first_page.get("total", 0) if first_page else 0,
             "needs_migration": 0,
             "migrated": 0,
             "errors": 0,
@@ -209,69 +263,77 @@ class QaseFieldMigration:
         print(f"Migrating from '{self.source_field_name}' (slug: {source_slug}) to '{self.destination_field_name}' (ID: {field_id})")
         print()
 
+        self.failed_cases = []
+        total = stats['total']
         processed_count = 0
-        
-        for test_case in test_cases:
-            processed_count += 1
-            case_id = test_case.get("id")
-            title = test_case.get("title", "Untitled")
-            source_value = test_case.get(source_slug, "")
-
-            # Update progress bar
-            # In verbose mode, update less frequently to avoid cluttering output
-            # In normal mode, update every case for smooth progress
-            if verbose:
-                # Update every 10 cases or at start/end
-                if processed_count == 1 or processed_count % 10 == 0 or processed_count == stats['total']:
-                    self.display_progress_bar(processed_count, stats['total'], stats)
-            else:
-                # Update every case for smooth progress
-                self.display_progress_bar(processed_count, stats['total'], stats)
-
-            if verbose:
-                # Show what we're checking (on a new line to not interfere with progress bar)
-                has_source_value = bool(source_value and source_value.strip())
-                custom_fields = test_case.get("custom_fields", [])
-                current_custom_value = ""
-                for field in custom_fields:
-                    if field.get("id") == self.destination_field_id:
-                        current_custom_value = field.get("value", "")
-                        break
-                
-                print(f"\nCase {case_id} ('{title}'): "
-                      f"{self.source_field_name}={('yes' if has_source_value else 'no')}, "
-                      f"{self.destination_field_name}={('set' if current_custom_value else 'empty')}")
-
-            updates = self.analyze_test_case(test_case)
-
-            if updates:
+
+        # Cases are analyzed in order; the blocking PATCH requests go to the
+        # thread pool so several are in flight at once
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            future_to_case = {}
+
+            for test_case in self.api.iter_test_cases(first_page):
+                processed_count += 1
+                case_id = test_case.get("id")
+                title = test_case.get("title", "Untitled")
+
+                # In verbose mode, update every 10 cases or at start/end to
+                # avoid cluttering output
+                if not verbose or processed_count == 1 or processed_count % 10 == 0 or processed_count == total:
+                    self.display_progress_bar(processed_count, total, stats)
+
+                updates = self.analyze_test_case(test_case)
+
+                if verbose:
+                    # Show what we're checking (on a new line to not interfere with progress bar)
+                    current_custom_value = next(
+                        (field.get("value", "") for field in test_case.get("custom_fields", [])
+                         if field.get("id") == self.destination_field_id),
+                        ""
+                    )
+                    print(f"\nCase {case_id} ('{title}'): "
+                          f"{self.source_field_name}={('yes' if updates else 'no')}, "
+                          f"{self.destination_field_name}={('set' if current_custom_value else 'empty')}")
+
+                if not updates:
+                    # analyze_test_case only returns None when the source field
+                    # is empty, so there is nothing to count as skipped here
+                    if verbose:
+                        print(f"\nCase {case_id} ('{title}'): No {self.source_field_name} to migrate")
+                    continue
+
                 stats["needs_migration"] += 1
                 if verbose:
+                    source_value = test_case.get(source_slug, "")
                     print(f"\nCase {case_id} ('{title}') needs migration:")
                     print(f"  {self.source_field_name} value: {source_value[:100]}{'...' if len(source_value) > 100 else ''}")
 
-                if not dry_run:
-                    if self.api.update_test_case(case_id, updates):
-                        stats["migrated"] += 1
-                        if verbose:
-                            print(f"  ✓ Successfully migrated case {case_id} (copied to {self.destination_field_name} and cleared {self.source_field_name})")
-                    else:
-                        stats["errors"] += 1
-                        print(f"\n  ✗ Failed to migrate case {case_id}")
-                else:
+                if dry_run:
                     if verbose:
                         print(f"  [DRY RUN] Would:")
                         print(f"    - Update custom field {self.destination_field_id} ({self.destination_field_name}) with {self.source_field_name} value")
                         print(f"    - Clear {self.source_field_name} field")
                     stats["migrated"] += 1  # Count as would-be migrated in dry run
-            else:
-                if source_value and source_value.strip():
-                    # Has source value but custom field already has the same value and source is already empty
-                    # (This case shouldn't happen due to our logic, but keeping for safety)
-                    stats["skipped"] += 1
-                elif verbose:
-                    print(f"\nCase {case_id} ('{title}'): No {self.source_field_name} to migrate")
-        
+                    continue
+
+                future = executor.submit(self.api.update_test_case, case_id, updates)
+                future_to_case[future] = (case_id, title)
+
+            # Collect update results as they complete
+            for future in as_completed(future_to_case):
+                case_id, title = future_to_case[future]
+                if future.result():
+                    stats["migrated"] += 1
+                    if verbose:
+                        print(f"  ✓ Successfully migrated case {case_id} (copied to {self.destination_field_name} and cleared {self.source_field_name})")
+                else:
+                    # Reported in the summary to keep the progress bar readable
+                    stats["errors"] += 1
+                    self.failed_cases.append((case_id, title))
+
+        # Cases may have been added or removed while streaming
+        stats["total"] = processed_count
+
         # Final progress bar update
         self.display_progress_bar(processed_count, stats['total'], stats)
 
@@ -298,47 +360,26 @@ class QaseFieldMigration:
 
         stats = self.process_all_cases(dry_run=dry_run, verbose=verbose)
 
-        print("\n" + "=" * 60)
-        print("Summary:")
-        print(f"  Total test cases: {stats['total']}")
-        print(f"  Cases needing migration: {stats['needs_migration']}")
-        print(f"  Cases migrated: {stats['migrated']}")
-        print(f"  Cases skipped (already migrated): {stats['skipped']}")
-        print(f"  Errors: {stats['errors']}")
+        # Build the summary first and write it in one go
+        summary = [
+            "\n" + "=" * 60,
+            "Summary:",
+            f"  Total test cases: {stats['total']}",
+            f"  Cases needing migration: {stats['needs_migration']}",
+            f"  Cases migrated: {stats['migrated']}",
+            f"  Cases skipped (already migrated): {stats['skipped']}",
+            f"  Errors: {stats['errors']}"
+        ]
+        if self.failed_cases:
+            summary.append("\n  Failed to migrate:")
+            for case_id, title in self.failed_cases[:MAX_LISTED_FAILURES]:
+                summary.append(f"    ✗ Case {case_id} ('{title}')")
+            if len(self.failed_cases) > MAX_LISTED_FAILURES:
+                summary.append(f"    (+{len(self.failed_cases) - MAX_LISTED_FAILURES} more)")
         if stats['needs_migration'] == 0 and stats['total'] > 0:
-            print(f"\n  [INFO] All test cases are already migrated! No {self.source_field_name} to migrate.")
-        print("=" * 60)
-
-
-def load_config(config_path: str = "config.json") -> Dict[str, Any]:
-    """
-    Load configuration from a JSON file.
-
-    Args:
-        config_path: Path to the config file
-
-    Returns:
-        Dictionary with configuration values
-
-    Raises:
-        FileNotFoundError: If config file doesn't exist
-        ValueError: If config file is invalid or missing required fields
-    """
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(
-            f"Config file '{config_path}' not found. "
-            f"Please create it with 'api_token' and 'project_code' fields."
-        )
-
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-
-    if "api_token" not in config:
-        raise ValueError("Config file must contain 'api_token' field")
-    if "project_code" not in config:
-        raise ValueError("Config file must contain 'project_code' field")
-
-    return config
+            summary.append(f"\n  [INFO] All test cases are already migrated! No {self.source_field_name} to migrate.")
+        summary.append("=" * 60)
+        print("\n".join(summary))
 
 
 def main():
@@ -383,6 +424,17 @@ def main():
         action="store_true",
         help="Show detailed information about each test case"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of concurrent workers for sending updates (default: 8)"
+    )
+    parser.add_argument(
+        "--use-field-cache",
+        action="store_true",
+        help="Reuse system and custom field definitions fetched by a run in the last hour"
+    )
 
     args = parser.parse_args()
 
@@ -394,7 +446,7 @@ def main():
     destination_field_id = args.destination_field_id
 
     try:
-        config = load_config(args.config)
+        config = load_project_config(args.config)
         api_token = api_token or config.get("api_token")
         project_code = project_code or config.get("project_code")
         source_field = source_field or config.get("source_field")
@@ -431,7 +483,9 @@ def main():
         project_code=project_code,
         source_field_name=source_field,
         destination_field_name=destination_field,
-        destination_field_id=destination_field_id
+        destination_field_id=destination_field_id,
+        num_workers=args.workers,
+        use_field_cache=args.use_field_cache
     )
 
     migration.run(dry_run=args.dry_run, verbose=args.verbose)
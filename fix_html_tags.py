@@ -7,154 +7,243 @@ in Qase test cases, including description, preconditions, postconditions,
 steps, and custom fields.
 """
 
-import json
-import os
 import argparse
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from html.parser import HTMLParser
 from typing import Dict, Optional, Any, List
 
-from qase_api import QaseAPI
+from qase_api import get_client
+from qase_common import load_project_config
 
 
-def strip_html_tags(text: str) -> str:
+_HTML_TAG = re.compile(r'<[^>]+>')
+_SPACE_RUN = re.compile(r' {2,}')
+
+# Whitespace runs that cleanup can change once tabs have become spaces: any
+# run of two or more whitespace characters, which may span line breaks.
+# Single spaces and single line breaks, the bulk of normal text, never match.
+# Spelled \s\s+ rather than \s{2,}: the engine rejects non-matching positions
+# noticeably faster with a plain leading \s.
+_WHITESPACE_RUN = re.compile(r'\s\s+')
+
+_LINE_BREAK = re.compile(r'\n')
+
+# Text fields checked on the test case itself
+_CASE_TEXT_FIELDS = ("description", "preconditions", "postconditions")
+
+# Text fields checked on each step of a test case
+_STEP_TEXT_FIELDS = ("action", "expected_result", "data")
+
+# Update keys counted once per fixed case in the summary
+_COUNTED_FIELDS = frozenset(_CASE_TEXT_FIELDS + ("steps",))
+
+# Elements whose content is not text in strict mode
+_SKIPPED_ELEMENTS = frozenset(("script", "style"))
+
+
+def _collapse_whitespace_run(match: re.Match) -> str:
+    """
+    Normalize one whitespace run the way per-line cleanup would.
+
+    A run containing line breaks spans the end of one line, any blank lines
+    and the start of the next: stripping those lines leaves only the line
+    breaks, of which at most two are kept. A run within a line has its
+    spaces collapsed to a single space.
+
+    Args:
+        match: Match of _WHITESPACE_RUN
+
+    Returns:
+        Replacement text for the run
+    """
+    run = match.group(0)
+    newlines = run.count('\n')
+    if newlines:
+        return '\n' if newlines == 1 else '\n\n'
+    # Usually the run is nothing but spaces; only other whitespace mixed in
+    # (e.g. a non-breaking space, which is kept) needs the regex
+    if not run.strip(' '):
+        return ' '
+    return _SPACE_RUN.sub(' ', run)
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the text of an HTML fragment, leaving entities as they are."""
+
+    def __init__(self, text: str):
+        super().__init__(convert_charrefs=False)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+        self._text = text
+        self._line_starts: Optional[List[int]] = None
+
+    def handle_starttag(self, tag: str, attrs: List[Any]) -> None:
+        if tag in _SKIPPED_ELEMENTS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in _SKIPPED_ELEMENTS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def handle_entityref(self, name: str) -> None:
+        self.handle_data(self._source_reference(len(name) + 1))
+
+    def handle_charref(self, name: str) -> None:
+        self.handle_data(self._source_reference(len(name) + 2))
+
+    def _source_reference(self, length: int) -> str:
+        """
+        Return the reference at the parser's position as written in the text.
+
+        The parser also reports references without their closing ";" (as in
+        "AT&T"), so the semicolon is only kept if the text has one.
+
+        Args:
+            length: Length of the reference up to its name's end, e.g. 4 for "&amp"
+
+        Returns:
+            The reference's source text
+        """
+        if self._line_starts is None:
+            self._line_starts = [0]
+            self._line_starts.extend(match.end() for match in _LINE_BREAK.finditer(self._text))
+        line, offset = self.getpos()
+        start = self._line_starts[line - 1] + offset
+        end = start + length
+        if self._text.startswith(';', end):
+            end += 1
+        return self._text[start:end]
+
+
+def _strip_tags_strict(text: str) -> str:
+    """
+    Remove HTML markup with a real parser instead of the tag regex.
+
+    Unlike the regex, this handles '>' inside attribute values and comments,
+    and drops the content of script and style elements.
+
+    Args:
+        text: Text that may contain HTML tags
+
+    Returns:
+        Text content of the fragment, possibly with a trailing line break
+    """
+    # The parser drops the "&" of a reference that ends the input, as in
+    # "AT&T", so a line break is fed after it; callers strip it again
+    text += '\n'
+    extractor = _TextExtractor(text)
+    extractor.feed(text)
+    extractor.close()
+    return ''.join(extractor.parts)
+
+
+@lru_cache(maxsize=8192)
+def strip_html_tags(text: str, strict: bool = False) -> str:
     """
     Remove HTML tags from text while preserving line breaks and content.
-    
+
+    Lines are trimmed, runs of spaces and tabs within a line collapse to one
+    space, and more than two consecutive line breaks collapse to two.
+    Results are cached, since the same boilerplate text tends to recur
+    across steps, custom fields and test cases.
+
     Args:
         text: Text that may contain HTML tags
-        
+        strict: Parse the markup with html.parser instead of the tag regex
+
     Returns:
         Text with HTML tags removed, preserving line breaks
     """
     if not text:
         return text
-    
-    # Remove HTML tags using regex
-    text = re.sub(r'<[^>]+>', '', text)
-    
-    # Preserve newlines but clean up extra spaces within lines
-    # Replace multiple spaces (but not newlines) with single space
-    lines = text.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        # Clean up multiple spaces within each line
-        cleaned_line = re.sub(r'[ \t]+', ' ', line.strip())
-        cleaned_lines.append(cleaned_line)
-    
-    # Join lines back together, preserving single newlines
-    text = '\n'.join(cleaned_lines)
-    
-    # Clean up excessive consecutive newlines (more than 2) to max 2
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    
-    return text.strip()
-
 
-def load_config(config_path: str = "config.json") -> Dict[str, Any]:
-    """Load configuration from a JSON file."""
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"Config file '{config_path}' not found.")
+    # Tags go first: whitespace on either side of a removed tag has to be
+    # treated as one run. A "<" after the last ">" can't start a tag, and
+    # trying each one would scan to the end of the text again, so only the
+    # text up to the last ">" is searched; this keeps the pass linear.
+    if '<' in text and strict:
+        text = _strip_tags_strict(text)
+    elif '<' in text:
+        tags_end = text.rfind('>') + 1
+        if tags_end:
+            text = _HTML_TAG.sub('', text[:tags_end]) + text[tags_end:]
 
-    with open(config_path, 'r') as f:
-        config = json.load(f)
+    # A tab is either trimmed or collapsed exactly like a space would be
+    if '\t' in text:
+        text = text.replace('\t', ' ')
 
-    if "api_token" not in config:
-        raise ValueError("Config file must contain 'api_token' field")
-    if "project_code" not in config:
-        raise ValueError("Config file must contain 'project_code' field")
+    # Trim lines and collapse spaces and blank lines in a single scan
+    return _WHITESPACE_RUN.sub(_collapse_whitespace_run, text).strip()
 
-    return config
 
-
-def analyze_test_case(test_case: Dict[str, Any]) -> Dict[str, Any]:
+def analyze_test_case(test_case: Dict[str, Any], strict: bool = False) -> Dict[str, Any]:
     """
     Analyze a test case and return fields that need HTML tag removal.
     
     Args:
         test_case: Test case dictionary from the API
+        strict: Parse the markup with html.parser instead of the tag regex
         
     Returns:
         Dictionary with only the fields that need fixing
     """
     updates = {}
     
-    # Check description
-    description = test_case.get("description")
-    if description:
-        cleaned_description = strip_html_tags(description)
-        if description != cleaned_description:
-            updates["description"] = cleaned_description
-    
-    # Check preconditions
-    preconditions = test_case.get("preconditions")
-    if preconditions:
-        cleaned_preconditions = strip_html_tags(preconditions)
-        if preconditions != cleaned_preconditions:
-            updates["preconditions"] = cleaned_preconditions
-    
-    # Check postconditions
-    postconditions = test_case.get("postconditions")
-    if postconditions:
-        cleaned_postconditions = strip_html_tags(postconditions)
-        if postconditions != cleaned_postconditions:
-            updates["postconditions"] = cleaned_postconditions
+    # Check description, preconditions and postconditions
+    for key in _CASE_TEXT_FIELDS:
+        value = test_case.get(key)
+        if value:
+            cleaned_value = strip_html_tags(value, strict)
+            if value != cleaned_value:
+                updates[key] = cleaned_value
     
     # Check steps
     steps = test_case.get("steps", [])
     if steps:
-        fixed_steps = []
-        steps_need_update = False
-        
-        for step in steps:
-            fixed_step = {}
-            step_updated = False
-            
-            # Include position (required for step identification)
-            if "position" in step:
-                fixed_step["position"] = step["position"]
-            
-            # Include hash if it exists
-            if "hash" in step:
-                fixed_step["hash"] = step["hash"]
-            
-            # Check action field
-            action = step.get("action")
-            if action:
-                cleaned_action = strip_html_tags(action)
-                if action != cleaned_action:
-                    fixed_step["action"] = cleaned_action
-                    step_updated = True
-                elif action is not None:
-                    fixed_step["action"] = action
-            
-            # Check expected_result field
-            expected_result = step.get("expected_result")
-            if expected_result:
-                cleaned_expected_result = strip_html_tags(expected_result)
-                if expected_result != cleaned_expected_result:
-                    fixed_step["expected_result"] = cleaned_expected_result
-                    step_updated = True
-                elif expected_result is not None:
-                    fixed_step["expected_result"] = expected_result
-            
-            # Check data field
-            data = step.get("data")
-            if data:
-                cleaned_data = strip_html_tags(data)
-                if data != cleaned_data:
-                    fixed_step["data"] = cleaned_data
-                    step_updated = True
-                elif data is not None:
-                    fixed_step["data"] = data
-            
-            if step_updated:
-                steps_need_update = True
-            
-            fixed_steps.append(fixed_step)
-        
-        if steps_need_update:
+        # Cleaned values per step index. The update payload is only built if
+        # at least one step changed, which most test cases never need.
+        step_fixes = {}
+
+        for index, step in enumerate(steps):
+            # Check action, expected_result and data fields
+            for key in _STEP_TEXT_FIELDS:
+                value = step.get(key)
+                if value:
+                    cleaned_value = strip_html_tags(value, strict)
+                    if value != cleaned_value:
+                        step_fixes.setdefault(index, {})[key] = cleaned_value
+
+        if step_fixes:
+            fixed_steps = []
+            for index, step in enumerate(steps):
+                fixed_step = {}
+
+                # Include position (required for step identification)
+                if "position" in step:
+                    fixed_step["position"] = step["position"]
+
+                # Include hash if it exists
+                if "hash" in step:
+                    fixed_step["hash"] = step["hash"]
+
+                # The API replaces the whole steps array, so unchanged fields
+                # are sent through as they are
+                fixed_fields = step_fixes.get(index, {})
+                for key in _STEP_TEXT_FIELDS:
+                    value = step.get(key)
+                    if value:
+                        fixed_step[key] = fixed_fields.get(key, value)
+
+                fixed_steps.append(fixed_step)
+
             updates["steps"] = fixed_steps
-    
+
     # Check custom_fields
     custom_fields = test_case.get("custom_fields", [])
     if custom_fields:
@@ -165,7 +254,7 @@ def analyze_test_case(test_case: Dict[str, Any]) -> Dict[str, Any]:
             field_id = field.get("id")
             value = field.get("value")
             if value and field_id is not None:
-                cleaned_value = strip_html_tags(value)
+                cleaned_value = strip_html_tags(value, strict)
                 if value != cleaned_value:
                     custom_field_updates[str(field_id)] = cleaned_value
                     custom_fields_need_update = True
@@ -196,12 +285,24 @@ def main():
         action="store_true",
         help="Show detailed information about each case"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of concurrent workers for sending updates (default: 8)"
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Strip tags with an HTML parser, for markup the fast regex gets wrong "
+             "(comments, '>' in attributes, script and style content)"
+    )
 
     args = parser.parse_args()
 
     # Load config
     try:
-        config = load_config(args.config)
+        config = load_project_config(args.config)
         api_token = config.get("api_token")
         project_code = config.get("project_code")
     except (FileNotFoundError, ValueError) as e:
@@ -210,15 +311,12 @@ def main():
     if not api_token or not project_code:
         parser.error("API token and project code are required in config file")
 
-    # Initialize API
-    api = QaseAPI(api_token, project_code)
-
-    # Fetch all test cases
-    print(f"\nFetching test cases from project '{project_code}'...")
-    test_cases = api.get_all_test_cases()
+    # Initialize API; the pool keeps a keep-alive connection for every
+    # update worker plus the page prefetch
+    api = get_client(api_token, project_code, pool_size=max(32, args.workers + 1))
 
     stats = {
-        "total": len(test_cases),
+        "total": 0,
         "has_html": 0,
         "fixed": 0,
         "errors": 0,
@@ -232,51 +330,59 @@ def main():
         }
     }
 
-    print(f"\nAnalyzing {stats['total']} test cases for HTML tags in all fields...")
+    fields_fixed = stats["fields_fixed"]
 
-    for test_case in test_cases:
-        case_id = test_case.get("id")
-        case_code = test_case.get("code", "")
-        title = test_case.get("title", "Untitled")
-        
-        # Analyze test case for HTML tags
-        updates = analyze_test_case(test_case)
-        
-        if updates:
-            stats["has_html"] += 1
-            
-            # Count which fields were fixed
-            if "description" in updates:
-                stats["fields_fixed"]["description"] += 1
-            if "preconditions" in updates:
-                stats["fields_fixed"]["preconditions"] += 1
-            if "postconditions" in updates:
-                stats["fields_fixed"]["postconditions"] += 1
-            if "steps" in updates:
-                stats["fields_fixed"]["steps"] += 1
-            if "custom_field" in updates:
-                stats["fields_fixed"]["custom_fields"] += len(updates["custom_field"])
-            
-            if args.verbose:
-                print(f"\n  Case {case_code} ({case_id}): '{title}'")
-                print(f"    Fields to fix: {list(updates.keys())}")
+    print("\nAnalyzing test cases for HTML tags in all fields as they are fetched...")
+
+    # Cases are analyzed page by page as they stream in; the blocking PATCH
+    # requests go to the thread pool so several are in flight at once
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        future_to_case = {}
+
+        for test_case in api.iter_test_cases():
+            stats["total"] += 1
+            case_id = test_case.get("id")
+            case_code = test_case.get("code", "")
+            title = test_case.get("title", "Untitled")
+
+            # Analyze test case for HTML tags
+            updates = analyze_test_case(test_case, args.strict)
+
+            if updates:
+                stats["has_html"] += 1
+
+                # Count which fields were fixed
+                for key in _COUNTED_FIELDS.intersection(updates):
+                    fields_fixed[key] += 1
                 if "custom_field" in updates:
-                    print(f"    Custom fields: {len(updates['custom_field'])} field(s)")
+                    fields_fixed["custom_fields"] += len(updates["custom_field"])
 
-            if not args.dry_run:
-                if api.update_test_case(case_id, updates):
-                    stats["fixed"] += 1
-                    print(f"  [OK] Fixed case {case_code} ({case_id})")
+                if args.verbose:
+                    print(f"\n  Case {case_code} ({case_id}): '{title}'")
+                    print(f"    Fields to fix: {list(updates.keys())}")
+                    if "custom_field" in updates:
+                        print(f"    Custom fields: {len(updates['custom_field'])} field(s)")
+
+                if not args.dry_run:
+                    future = executor.submit(api.update_test_case, case_id, updates)
+                    future_to_case[future] = (case_id, case_code)
                 else:
-                    stats["errors"] += 1
-                    print(f"  [ERROR] Failed to fix case {case_code} ({case_id})")
+                    print(f"  [DRY RUN] Would fix case {case_code} ({case_id})")
+                    stats["fixed"] += 1
             else:
-                print(f"  [DRY RUN] Would fix case {case_code} ({case_id})")
+                if args.verbose:
+                    print(f"  [SKIP] Case {case_code} ({case_id}): No HTML tags found")
+                stats["skipped"] += 1
+
+        # Collect update results as they complete
+        for future in as_completed(future_to_case):
+            case_id, case_code = future_to_case[future]
+            if future.result():
                 stats["fixed"] += 1
-        else:
-            if args.verbose:
-                print(f"  [SKIP] Case {case_code} ({case_id}): No HTML tags found")
-            stats["skipped"] += 1
+                print(f"  [OK] Fixed case {case_code} ({case_id})")
+            else:
+                stats["errors"] += 1
+                print(f"  [ERROR] Failed to fix case {case_code} ({case_id})")
 
     print("\n" + "=" * 60)
     print("Summary:")
@@ -8,11 +8,53 @@ This script:
 3. Attaches JIRA issues to test cases using the Qase External Issues API
 """
 
-import json
-import os
 import argparse
 import re
-from typing import Dict, List, Any, Optional, Set
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Set, Tuple
+
+from qase_api import get_client
+from qase_common import load_config
+
+
+# Pattern to match JIRA issue IDs: one or more uppercase letters,
+# followed by dash and numbers
+_JIRA_ISSUE_ID = re.compile(r'\b([A-Z][A-Z0-9]+-\d+)\b')
+
+
+@lru_cache(maxsize=4096)
+def _find_jira_issue_ids(text: str) -> Tuple[str, ...]:
+    """
+    Find the unique JIRA issue IDs in a text, in order of appearance.
+
+    Results are cached, since the same refs values tend to recur across
+    the test cases of a project.
+
+    Args:
+        text: Text to search for JIRA issue IDs
+
+    Returns:
+        Tuple of unique JIRA issue IDs found (shared between callers)
+    """
+    return tuple(dict.fromkeys(_JIRA_ISSUE_ID.findall(text)))
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Split items into consecutive lists of at most size items.
+
+    Args:
+        items: Items to split
+        size: Maximum number of items per chunk
+
+    Yields:
+        Lists of items, in order
+    """
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 class JIRAIssueExtractor:
@@ -30,32 +72,26 @@ class JIRAIssueExtractor:
         Returns:
             List of unique JIRA issue IDs found
         """
-        if not text:
+        # Every JIRA ID contains a dash; most refs without one (free text,
+        # empty values) can skip the regex altogether
+        if not text or '-' not in text:
             return []
 
-        jira_ids = []
-        # Pattern to match JIRA issue IDs: one or more uppercase letters,
-        # followed by dash and numbers
-        jira_pattern = re.compile(r'\b([A-Z][A-Z0-9]+-\d+)\b')
-
         # Extract JIRA IDs from the text (handles URLs and plain issue IDs)
-        matches = jira_pattern.findall(text)
-        jira_ids.extend(matches)
-
-        # Return unique IDs, preserving order
-        seen = set()
-        unique_ids = []
-        for jira_id in jira_ids:
-            if jira_id not in seen:
-                seen.add(jira_id)
-                unique_ids.append(jira_id)
-
-        return unique_ids
+        # and return the unique ones, preserving order
+        return list(_find_jira_issue_ids(text))
 
     @staticmethod
-    def extract_from_test_case(test_case: Dict[str, Any], refs_field_id: Optional[int] = None, debug: bool = False) -> List[str]:
+    def find_refs(
+        test_case: Dict[str, Any],
+        refs_field_id: Optional[int] = None,
+        debug: bool = False
+    ) -> Tuple[bool, Any, Optional[str]]:
         """
-        Extract JIRA issue IDs from the refs field in a test case.
+        Find the refs value of a test case.
+
+        The refs custom field is used if it is set, otherwise the refs or
+        references system field.
 
         Args:
             test_case: Test case dictionary from the API
@@ -63,11 +99,12 @@ class JIRAIssueExtractor:
             debug: If True, print debug information
 
         Returns:
-            List of unique JIRA issue IDs found in the refs field
+            Tuple of (whether the case has a refs field, refs value, refs source)
         """
         refs = None
         refs_source = None
-        
+        refs_found = False
+
         # First try to get from custom field if field ID is provided
         if refs_field_id is not None:
             custom_fields = test_case.get("custom_fields", [])
@@ -79,26 +116,41 @@ class JIRAIssueExtractor:
                 if field_id == refs_field_id:
                     refs = field.get("value")
                     refs_source = f"custom_field[{field_id}]"
+                    refs_found = True
                     if debug:
                         print(f"    Found refs in custom field ID {field_id}: {repr(refs)}")
                     break
-        
+
         # Fallback to system fields if not found in custom fields
         if not refs:
-            refs = test_case.get("refs")
-            if refs:
-                refs_source = "system_field[refs]"
-            else:
-                refs = test_case.get("references")
-                if refs:
-                    refs_source = "system_field[references]"
-            
-            if debug and refs:
-                print(f"    Found refs in system field: {repr(refs)}")
-        
+            for key in ("refs", "references"):
+                system_refs = test_case.get(key)
+                if system_refs:
+                    refs = system_refs
+                    refs_source = f"system_field[{key}]"
+                    refs_found = True
+                    if debug:
+                        print(f"    Found refs in system field: {repr(refs)}")
+                    break
+
+        return refs_found, refs, refs_source
+
+    @staticmethod
+    def extract_from_refs(refs: Any, refs_source: Optional[str] = None, debug: bool = False) -> List[str]:
+        """
+        Extract JIRA issue IDs from a refs value.
+
+        Args:
+            refs: Refs value, a list of strings or a single string
+            refs_source: Where the refs value came from, shown in debug output
+            debug: If True, print debug information
+
+        Returns:
+            List of unique JIRA issue IDs found in the refs value
+        """
         if not refs:
             if debug:
-                print(f"    No refs field found")
+                print("    No refs field found")
             return []
 
         if debug:
@@ -115,38 +167,50 @@ class JIRAIssueExtractor:
             # If refs is a single string, treat it as a list with one item
             refs_list = [refs]
             if debug:
-                print(f"    Refs is a string, converting to list")
+                print("    Refs is a string, converting to list")
         else:
             if debug:
                 print(f"    Refs type {type(refs).__name__} not supported, returning empty")
             return []
 
-        # Extract JIRA IDs from each ref string
-        jira_ids = []
-        for idx, ref in enumerate(refs_list):
-            if isinstance(ref, str):
-                if debug:
+        if debug:
+            # Show what each ref string contributes
+            for idx, ref in enumerate(refs_list):
+                if isinstance(ref, str):
                     print(f"    Processing ref[{idx}]: {repr(ref)}")
-                extracted = JIRAIssueExtractor._extract_jira_issue_ids(ref)
-                if debug and extracted:
-                    print(f"      Extracted JIRA IDs: {extracted}")
-                jira_ids.extend(extracted)
-            elif debug:
-                print(f"    Skipping ref[{idx}]: not a string (type: {type(ref).__name__})")
-
-        # Return unique IDs, preserving order
-        seen = set()
-        unique_ids = []
-        for jira_id in jira_ids:
-            if jira_id not in seen:
-                seen.add(jira_id)
-                unique_ids.append(jira_id)
+                    extracted = JIRAIssueExtractor._extract_jira_issue_ids(ref)
+                    if extracted:
+                        print(f"      Extracted JIRA IDs: {extracted}")
+                else:
+                    print(f"    Skipping ref[{idx}]: not a string (type: {type(ref).__name__})")
+
+        # Extract the unique JIRA IDs from all ref strings in a single scan.
+        # A line break can't be part of an ID, so no match spans two refs.
+        unique_ids = JIRAIssueExtractor._extract_jira_issue_ids(
+            "\n".join(ref for ref in refs_list if isinstance(ref, str))
+        )
 
         if debug:
             print(f"    Final unique JIRA IDs: {unique_ids}")
 
         return unique_ids
 
+    @staticmethod
+    def extract_from_test_case(test_case: Dict[str, Any], refs_field_id: Optional[int] = None, debug: bool = False) -> List[str]:
+        """
+        Extract JIRA issue IDs from the refs field in a test case.
+
+        Args:
+            test_case: Test case dictionary from the API
+            refs_field_id: Custom field ID for the refs field (if stored as custom field)
+            debug: If True, print debug information
+
+        Returns:
+            List of unique JIRA issue IDs found in the refs field
+        """
+        _, refs, refs_source = JIRAIssueExtractor.find_refs(test_case, refs_field_id, debug)
+        return JIRAIssueExtractor.extract_from_refs(refs, refs_source, debug)
+
 
 class QaseJIRALinker:
     """Main class for linking JIRA issues to Qase test cases."""
@@ -158,7 +222,8 @@ class QaseJIRALinker:
         external_issue_type: str = "jira-cloud",
         batch_size: int = 50,
         refs_field_name: str = "refs",
-        refs_field_id: Optional[int] = None
+        refs_field_id: Optional[int] = None,
+        num_workers: int = 4
     ):
         """
         Initialize the JIRA linker.
@@ -170,14 +235,15 @@ class QaseJIRALinker:
             batch_size: Number of cases to process in each API batch
             refs_field_name: Name of the refs field to search for (default: "refs")
             refs_field_id: Direct field ID for refs field (if provided, skips search by name)
+            num_workers: Number of batches attached concurrently
         """
-        from qase_api import QaseAPI
-        self.api = QaseAPI(api_token, project_code)
+        self.api = get_client(api_token, project_code)
         self.extractor = JIRAIssueExtractor()
         self.external_issue_type = external_issue_type
         self.batch_size = batch_size
         self.refs_field_name = refs_field_name
         self.refs_field_id = refs_field_id
+        self.num_workers = num_workers
 
     def find_refs_field_id(self) -> Optional[int]:
         """
@@ -229,6 +295,27 @@ class QaseJIRALinker:
         print(f"\nWarning: '{self.refs_field_name}' field not found in custom fields. Will try system fields.")
         return None
 
+    @staticmethod
+    def _print_sample_case(sample_case: Dict[str, Any]):
+        """
+        Print the structure of a test case, to help locate its refs field.
+
+        Args:
+            sample_case: Test case dictionary from the API
+        """
+        print("\n=== Sample test case structure (first case) ===")
+        print(f"Case ID: {sample_case.get('id')}")
+        print(f"Case Code: {sample_case.get('code')}")
+        print(f"Available fields: {list(sample_case.keys())}")
+        print(f"Custom fields count: {len(sample_case.get('custom_fields', []))}")
+        if sample_case.get('custom_fields'):
+            print("Custom fields:")
+            for cf in sample_case.get('custom_fields', [])[:5]:  # Show first 5
+                print(f"  - ID: {cf.get('id')}, Value: {repr(cf.get('value'))[:100]}")
+        print(f"System 'refs' field: {repr(sample_case.get('refs'))}")
+        print(f"System 'references' field: {repr(sample_case.get('references'))}")
+        print("=" * 60)
+
     def process_all_cases(self, dry_run: bool = False, verbose: bool = False) -> Dict[str, int]:
         """
         Process all test cases and attach JIRA issues.
@@ -243,9 +330,8 @@ class QaseJIRALinker:
         # First, find the refs field ID from custom fields
         self.find_refs_field_id()
 
-        test_cases = self.api.get_all_test_cases()
         stats = {
-            "total": len(test_cases),
+            "total": 0,
             "with_jira_issues": 0,
             "total_jira_issues": 0,  # Total occurrences (may include duplicates across cases)
             "unique_jira_issues": set(),  # Unique JIRA issue IDs across all cases
@@ -256,61 +342,48 @@ class QaseJIRALinker:
             "cases_without_refs": 0
         }
 
-        print(f"\nAnalyzing {stats['total']} test cases for JIRA issues in refs field...")
+        print("\nAnalyzing test cases for JIRA issues in refs field as they are fetched...")
         print(f"Using refs field ID: {self.refs_field_id}")
 
         # Collect all cases with JIRA issues
         jira_links = []
-        
-        # Debug: Sample a few test cases to see their structure
-        if verbose and test_cases:
-            print("\n=== Sample test case structure (first case) ===")
-            sample_case = test_cases[0]
-            print(f"Case ID: {sample_case.get('id')}")
-            print(f"Case Code: {sample_case.get('code')}")
-            print(f"Available fields: {list(sample_case.keys())}")
-            print(f"Custom fields count: {len(sample_case.get('custom_fields', []))}")
-            if sample_case.get('custom_fields'):
-                print("Custom fields:")
-                for cf in sample_case.get('custom_fields', [])[:5]:  # Show first 5
-                    print(f"  - ID: {cf.get('id')}, Value: {repr(cf.get('value'))[:100]}")
-            print(f"System 'refs' field: {repr(sample_case.get('refs'))}")
-            print(f"System 'references' field: {repr(sample_case.get('references'))}")
-            print("=" * 60)
-
-        for test_case in test_cases:
-            case_id = test_case.get("id")
-            case_code = test_case.get("code", "")
-            title = test_case.get("title", "Untitled")
-
-            # Debug: Check if refs field exists
-            refs_found = False
-            refs_value = None
-            
-            if self.refs_field_id is not None:
-                custom_fields = test_case.get("custom_fields", [])
-                for field in custom_fields:
-                    if field.get("id") == self.refs_field_id:
-                        refs_value = field.get("value")
-                        refs_found = True
-                        break
-            
-            if not refs_found:
-                refs_value = test_case.get("refs") or test_case.get("references")
-                if refs_value:
-                    refs_found = True
-            
+
+        find_refs = self.extractor.find_refs
+        extract_from_refs = self.extractor.extract_from_refs
+        refs_field_id = self.refs_field_id
+
+        # Cases are analyzed page by page as they stream in, so only the
+        # links found are kept rather than the whole project
+        for test_case in self.api.iter_test_cases():
+            stats["total"] += 1
+
+            # Debug: Show the structure of the first test case
+            if verbose and stats["total"] == 1:
+                self._print_sample_case(test_case)
+
+            # Look up the refs value once; it is both counted and extracted from
+            refs_found, refs_value, refs_source = find_refs(test_case, refs_field_id, verbose)
+
             if refs_found:
                 stats["cases_with_refs"] += 1
             else:
+                # Without a refs field there is nothing to extract from
                 stats["cases_without_refs"] += 1
+                if verbose:
+                    print("    No refs field found")
+                continue
+
+            jira_ids = extract_from_refs(refs_value, refs_source, verbose)
 
-            jira_ids = self.extractor.extract_from_test_case(test_case, self.refs_field_id, debug=verbose)
+            # The case's own fields are only needed for a link or verbose output
+            if jira_ids or verbose:
+                case_id = test_case.get("id")
+                case_code = test_case.get("code", "")
+                title = test_case.get("title", "Untitled")
 
             if jira_ids:
                 stats["with_jira_issues"] += 1
                 stats["total_jira_issues"] += len(jira_ids)
-                stats["unique_jira_issues"].update(jira_ids)  # Add to set of unique issues
                 jira_links.append({
                     "case_id": case_id,
                     "external_issues": jira_ids
@@ -318,7 +391,7 @@ class QaseJIRALinker:
 
                 if verbose:
                     print(f"Case {case_code} ({case_id}): '{title}'")
-                    print(f"  Refs field ID: {self.refs_field_id}")
+                    print(f"  Refs field ID: {refs_field_id}")
                     print(f"  Refs value: {repr(refs_value)}")
                     print(f"  Refs type: {type(refs_value).__name__}")
                     print(f"  Found JIRA issues: {jira_ids}")
@@ -330,6 +403,9 @@ class QaseJIRALinker:
                 print(f"  Refs type: {type(refs_value).__name__}")
                 print(f"  No JIRA issues found in refs")
 
+        # Unique issues across all cases, built in one go from the links
+        stats["unique_jira_issues"] = set(chain.from_iterable(link["external_issues"] for link in jira_links))
+
         print(f"\n=== Analysis Summary ===")
         print(f"Total test cases: {stats['total']}")
         print(f"Cases with refs field: {stats['cases_with_refs']}")
@@ -352,27 +428,33 @@ class QaseJIRALinker:
             total_failed = 0
             failed_batches = []  # Store failed batches for retry
 
-            for i in range(0, len(jira_links), self.batch_size):
-                batch = jira_links[i:i + self.batch_size]
-                batch_num = i // self.batch_size + 1
-
-                try:
-                    if self.api.attach_external_issues(self.external_issue_type, batch):
-                        total_attached += len(batch)
-                        stats["cases_attached"] += len(batch)
-                        stats["batches_attached"] += 1
-                        print(f"  ✓ Successfully attached batch {batch_num} ({len(batch)} cases)")
-                    else:
-                        # Batch failed - store for individual retry
+            # Each batch is one blocking request; keep several in flight at once
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                future_to_batch = {}
+                for batch_num, batch in enumerate(_chunks(jira_links, self.batch_size), 1):
+                    future = executor.submit(self.api.attach_external_issues, self.external_issue_type, batch)
+                    future_to_batch[future] = (batch_num, batch)
+
+                for future in as_completed(future_to_batch):
+                    batch_num, batch = future_to_batch[future]
+                    try:
+                        if future.result():
+                            total_attached += len(batch)
+                            stats["cases_attached"] += len(batch)
+                            stats["batches_attached"] += 1
+                            print(f"  ✓ Successfully attached batch {batch_num} ({len(batch)} cases)")
+                        else:
+                            # Batch failed - store for individual retry
+                            failed_batches.append((batch_num, batch))
+                            print(f"  ✗ Failed to attach batch {batch_num} ({len(batch)} cases) - will retry individually")
+                    except Exception as e:
+                        # Batch failed with exception - store for individual retry
                         failed_batches.append((batch_num, batch))
-                        print(f"  ✗ Failed to attach batch {batch_num} ({len(batch)} cases) - will retry individually")
-                except Exception as e:
-                    # Batch failed with exception - store for individual retry
-                    failed_batches.append((batch_num, batch))
-                    print(f"  ✗ Exception attaching batch {batch_num}: {e} - will retry individually")
+                        print(f"  ✗ Exception attaching batch {batch_num}: {e} - will retry individually")
 
-            # Retry failed batches as individual cases
+            # Retry failed batches as individual cases, in batch order
             if failed_batches:
+                failed_batches.sort(key=lambda failed: failed[0])
                 print(f"\nRetrying {len(failed_batches)} failed batches as individual cases...")
                 for batch_num, batch in failed_batches:
                     for link in batch:
@@ -398,10 +480,9 @@ class QaseJIRALinker:
             print(f"\nAttachment complete: {total_attached} cases succeeded, {total_failed} cases failed")
         else:
             # Dry run: show what would be attached
-            print(f"\n[DRY RUN] Would attach JIRA issues in {len(jira_links) // self.batch_size + 1} batches:")
-            for i in range(0, len(jira_links), self.batch_size):
-                batch = jira_links[i:i + self.batch_size]
-                batch_num = i // self.batch_size + 1
+            num_batches = (len(jira_links) + self.batch_size - 1) // self.batch_size
+            print(f"\n[DRY RUN] Would attach JIRA issues in {num_batches} batches:")
+            for batch_num, batch in enumerate(_chunks(jira_links, self.batch_size), 1):
                 print(f"  Batch {batch_num}: {len(batch)} cases")
                 if verbose:
                     for link in batch[:5]:  # Show first 5 cases in batch
@@ -450,32 +531,6 @@ class QaseJIRALinker:
         print("=" * 60)
 
 
-def load_config(config_path: str = "config.json") -> Dict[str, Any]:
-    """
-    Load configuration from a JSON file.
-
-    Args:
-        config_path: Path to the config file
-
-    Returns:
-        Dictionary with configuration values
-
-    Raises:
-        FileNotFoundError: If config file doesn't exist
-        ValueError: If config file is invalid or missing required fields
-    """
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(
-            f"Config file '{config_path}' not found. "
-            f"Please create it with 'api_token' and 'project_code' fields."
-        )
-
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-
-    return config
-
-
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(
@@ -506,6 +561,12 @@ def main():
         default=50,
         help="Number of cases per batch (default: 50)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of batches attached concurrently (default: 4)"
+    )
     parser.add_argument(
         "--refs-field",
         default=None,
@@ -586,7 +647,8 @@ def main():
         external_issue_type=args.type,
         batch_size=args.batch_size,
         refs_field_name=refs_field_name,
-        refs_field_id=refs_field_id
+        refs_field_id=refs_field_id,
+        num_workers=args.workers
     )
 
     linker.run(dry_run=args.dry_run, verbose=args.verbose)
@@ -4,14 +4,36 @@ Qase API Client
 Handles all API interactions with the Qase API.
 """
 
+import hashlib
+import json
+import os
+import time
 import requests
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterator, List, Any, Optional
+
+from qase_common import json_dumps, json_loads, make_session
+
+# Where field definitions are cached between runs (see field_cache_ttl)
+FIELD_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "qase-migration")
+
+# Times a write rejected by the rate limit (HTTP 429) is retried
+RATE_LIMIT_RETRIES = 5
 
 
 class QaseAPI:
     """Client for interacting with the Qase API."""
 
-    def __init__(self, api_token: str, project_code: str, base_url: str = "https://api.qase.io/v1"):
+    def __init__(
+        self,
+        api_token: str,
+        project_code: str,
+        base_url: str = "https://api.qase.io/v1",
+        field_cache_ttl: Optional[float] = None,
+        refresh_field_cache: bool = False,
+        pool_size: int = 32
+    ):
         """
         Initialize the Qase API client.
 
@@ -19,6 +41,10 @@ class QaseAPI:
             api_token: Qase API token
             project_code: Project code (e.g., 'CR')
             base_url: Base URL for the API (default: https://api.qase.io/v1)
+            field_cache_ttl: If set, system and custom field definitions are cached on
+                             disk and reused for this many seconds (default: no caching)
+            refresh_field_cache: If True, ignore cached field definitions and fetch them again
+            pool_size: Maximum number of pooled connections to the API host
         """
         self.api_token = api_token
         self.project_code = project_code
@@ -29,55 +55,159 @@ class QaseAPI:
             "content-type": "application/json"
         }
         self.max_limit = 100
+        # One pooled keep-alive session, shared by the update worker threads
+        self.session = make_session(api_token, pool_size)
+        self.session.headers.update(self.headers)
+        self.field_cache_ttl = field_cache_ttl
+        self.refresh_field_cache = refresh_field_cache
+        # Monotonic time until which writes hold off after a 429, shared by
+        # all worker threads so they back off together
+        self._throttled_until = 0.0
+
+    def _field_cache_path(self, name: str) -> str:
+        """
+        Get the cache file path for a kind of field definition.
+
+        Field definitions belong to the workspace, so the file is keyed by a
+        digest of the API token rather than by project.
+
+        Args:
+            name: Kind of field definition (e.g., 'custom-fields')
 
-    def get_all_test_cases(self) -> List[Dict[str, Any]]:
+        Returns:
+            Path of the cache file
+        """
+        digest = hashlib.sha256(self.api_token.encode()).hexdigest()[:16]
+        return os.path.join(FIELD_CACHE_DIR, f"{name}-{digest}.json")
+
+    def _read_field_cache(self, name: str) -> Optional[List[Dict[str, Any]]]:
         """
-        Fetch all test cases from the project using pagination.
+        Read cached field definitions if caching is enabled and the cache is fresh.
+
+        Args:
+            name: Kind of field definition (e.g., 'custom-fields')
 
         Returns:
-            List of all test case dictionaries
+            Cached field dictionaries, or None if they have to be fetched
+        """
+        if self.field_cache_ttl is None or self.refresh_field_cache:
+            return None
+
+        path = self._field_cache_path(name)
+        try:
+            if time.time() - os.path.getmtime(path) > self.field_cache_ttl:
+                return None
+            with open(path, 'r') as f:
+                fields = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        print(f"Using cached {name.replace('-', ' ')} from {path}")
+        return fields
+
+    def _write_field_cache(self, name: str, fields: List[Dict[str, Any]]) -> None:
+        """
+        Cache field definitions on disk if caching is enabled.
+
+        Args:
+            name: Kind of field definition (e.g., 'custom-fields')
+            fields: Field dictionaries to cache
+        """
+        if self.field_cache_ttl is None:
+            return
+
+        path = self._field_cache_path(name)
+        try:
+            os.makedirs(FIELD_CACHE_DIR, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(fields, f)
+        except OSError as e:
+            print(f"Warning: could not write field cache {path}: {e}")
+
+    def _fetch_test_case_page(self, offset: int, limit: int) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a single page of test cases.
+
+        Args:
+            offset: Offset of the first test case on the page
+            limit: Page size
+
+        Returns:
+            The page's result dictionary, or None if the request failed
+        """
+        url = f"{self.base_url}/case/{self.project_code}"
+        params = {"limit": limit, "offset": offset}
+
+        try:
+            response = self.session.get(url, params=params)
+            response.raise_for_status()
+            data = json_loads(response.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching test cases: {e}")
+            if hasattr(e, 'response') and e.response is not None:
+                print(f"Response: {e.response.text}")
+            return None
+
+        if not data.get("status"):
+            print("Error: API returned status false")
+            return None
+
+        return data.get("result", {})
+
+    def get_first_test_case_page(self) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the first page of test cases, e.g. to learn the total up front.
+
+        Pass the page to iter_test_cases so it isn't requested again.
+
+        Returns:
+            The page's result dictionary, or None if the request failed
+        """
+        return self._fetch_test_case_page(0, self.max_limit)
+
+    def iter_test_cases(self, first_page: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield all test cases from the project, fetching one page at a time.
+
+        Callers can start working on the first page while later pages are
+        still to be fetched, and only one page is held in memory at a time.
+        The next page is requested in the background while the current one
+        is being consumed.
+
+        Args:
+            first_page: Result of get_first_test_case_page, if already fetched
+
+        Yields:
+            Test case dictionaries
         """
-        all_cases = []
         offset = 0
         limit = self.max_limit
 
         print(f"Fetching test cases from project '{self.project_code}'...")
 
-        while True:
-            url = f"{self.base_url}/case/{self.project_code}"
-            params = {"limit": limit, "offset": offset}
-
-            try:
-                response = requests.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                data = response.json()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            result = first_page
+            if result is None:
+                result = self._fetch_test_case_page(offset, limit)
 
-                if not data.get("status"):
-                    print(f"Error: API returned status false")
-                    break
-
-                result = data.get("result", {})
+            while result is not None:
                 entities = result.get("entities", [])
                 total = result.get("total", 0)
                 count = result.get("count", 0)
 
-                all_cases.extend(entities)
-                print(f"Fetched {len(entities)} cases (offset: {offset}, total: {total})")
-
                 # Check if we've fetched all cases
-                if offset + count >= total or len(entities) == 0:
-                    break
+                next_page = None
+                if offset + count < total and len(entities) > 0:
+                    next_page = executor.submit(self._fetch_test_case_page, offset + count, limit)
 
-                offset += count
+                print(f"Fetched {len(entities)} cases (offset: {offset}, total: {total})")
+                yield from entities
 
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching test cases: {e}")
-                if hasattr(e, 'response') and e.response is not None:
-                    print(f"Response: {e.response.text}")
-                break
+                if next_page is None:
+                    return
 
-        print(f"Total test cases fetched: {len(all_cases)}")
-        return all_cases
+                offset += count
+                result = next_page.result()
 
     def get_system_fields(self) -> List[Dict[str, Any]]:
         """
@@ -86,20 +216,25 @@ class QaseAPI:
         Returns:
             List of system field dictionaries
         """
+        cached = self._read_field_cache("system-fields")
+        if cached is not None:
+            return cached
+
         url = f"{self.base_url}/system_field"
 
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url)
             response.raise_for_status()
-            data = response.json()
+            data = json_loads(response.content)
 
             if not data.get("status"):
                 print(f"Error: API returned status false")
                 return []
 
             result = data.get("result", [])
+            self._write_field_cache("system-fields", result)
             return result
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"Error fetching system fields: {e}")
             if hasattr(e, 'response') and e.response is not None:
                 print(f"Response: {e.response.text}")
@@ -112,9 +247,14 @@ class QaseAPI:
         Returns:
             List of custom field dictionaries
         """
+        cached = self._read_field_cache("custom-fields")
+        if cached is not None:
+            return cached
+
         all_fields = []
         offset = 0
         limit = self.max_limit
+        complete = False
 
         print(f"Fetching custom fields from workspace...")
 
@@ -123,9 +263,9 @@ class QaseAPI:
             params = {"limit": limit, "offset": offset}
 
             try:
-                response = requests.get(url, headers=self.headers, params=params)
+                response = self.session.get(url, params=params)
                 response.raise_for_status()
-                data = response.json()
+                data = json_loads(response.content)
 
                 if not data.get("status"):
                     print(f"Error: API returned status false")
@@ -141,19 +281,93 @@ class QaseAPI:
 
                 # Check if we've fetched all fields
                 if offset + count >= total or len(entities) == 0:
+                    complete = True
                     break
 
                 offset += count
 
-            except requests.exceptions.RequestException as e:
+            except (requests.exceptions.RequestException, ValueError) as e:
                 print(f"Error fetching custom fields: {e}")
                 if hasattr(e, 'response') and e.response is not None:
                     print(f"Response: {e.response.text}")
                 break
 
         print(f"Total custom fields fetched: {len(all_fields)}")
+        # Never cache a partial listing
+        if complete:
+            self._write_field_cache("custom-fields", all_fields)
         return all_fields
 
+    def _note_rate_limit(self, response: requests.Response) -> float:
+        """
+        Hold off further writes for as long as a 429 response asks.
+
+        Args:
+            response: Response with status 429
+
+        Returns:
+            Number of seconds to wait before retrying
+        """
+        try:
+            delay = max(float(response.headers.get("Retry-After", 1)), 0.0)
+        except ValueError:
+            # Retry-After may also be an HTTP date; just wait a second then
+            delay = 1.0
+        self._throttled_until = max(self._throttled_until, time.monotonic() + delay)
+        return delay
+
+    def _wait_for_rate_limit(self) -> None:
+        """Sleep until the current rate limit back-off, if any, has passed."""
+        delay = self._throttled_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _send_write(self, send: Any, url: str, body: bytes, action: str) -> requests.Response:
+        """
+        Send a write request, retrying it while the rate limit rejects it.
+
+        A 429 means the request was rejected before being applied, so it is
+        safe to send again once the rate limit window has passed.
+
+        Args:
+            send: Session method to send the request with (e.g. self.session.patch)
+            url: Request URL
+            body: Encoded JSON request body
+            action: What the request does, used in messages (e.g. 'updating case 12')
+
+        Returns:
+            The last response received
+        """
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self._wait_for_rate_limit()
+            response = send(url, data=body)
+            if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                break
+            delay = self._note_rate_limit(response)
+            print(f"Rate limited while {action}, retrying in {delay:g}s")
+        return response
+
+    def patch_test_case(self, case_id: int, updates: Dict[str, Any]) -> requests.Response:
+        """
+        Send a test case update and return the response without checking it.
+
+        For callers that need to inspect a failed update, e.g. to fix the
+        payload and send it again. Rate limiting is handled as for
+        update_test_case.
+
+        Args:
+            case_id: ID of the test case to update
+            updates: Dictionary containing fields to update
+
+        Returns:
+            The API's response
+
+        Raises:
+            requests.exceptions.RequestException: If the request could not be sent
+        """
+        url = f"{self.base_url}/case/{self.project_code}/{case_id}"
+        return self._send_write(self.session.patch, url, json_dumps(updates), f"updating case {case_id}")
+
     def update_test_case(self, case_id: int, updates: Dict[str, Any]) -> bool:
         """
         Update a test case with the provided updates.
@@ -165,10 +379,8 @@ class QaseAPI:
         Returns:
             True if update was successful, False otherwise
         """
-        url = f"{self.base_url}/case/{self.project_code}/{case_id}"
-
         try:
-            response = requests.patch(url, headers=self.headers, json=updates)
+            response = self.patch_test_case(case_id, updates)
             response.raise_for_status()
             return True
         except requests.exceptions.RequestException as e:
@@ -199,9 +411,9 @@ class QaseAPI:
                 "links": links
             }
 
-            response = requests.post(url, headers=self.headers, json=payload)
+            response = self._send_write(self.session.post, url, json_dumps(payload), "attaching external issues")
             response.raise_for_status()
-            data = response.json()
+            data = json_loads(response.content)
 
             if data and data.get("status"):
                 return True
@@ -210,8 +422,27 @@ class QaseAPI:
                 print(f"Failed to attach external issues: {error_msg}")
                 return False
 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"Exception when attaching external issues: {e}")
             if hasattr(e, 'response') and e.response is not None:
                 print(f"Response: {e.response.text}")
-            return False
\ No newline at end of file
+            return False
+
+
+@lru_cache(maxsize=None)
+def get_client(api_token: str, project_code: str, **options: Any) -> QaseAPI:
+    """
+    Get the process-wide QaseAPI client for a token and project.
+
+    Repeated calls with the same arguments return the same client, so scripts
+    run from one driver share its pooled session.
+
+    Args:
+        api_token: Qase API token
+        project_code: Project code (e.g., 'CR')
+        **options: Additional QaseAPI keyword arguments
+
+    Returns:
+        Shared QaseAPI instance
+    """
+    return QaseAPI(api_token, project_code, **options)
@@ -0,0 +1,293 @@
+"""
+Shared Workspace Helpers
+
+Config loading, pooled session setup, and a workspace-level Qase API client
+used by the maintenance scripts that operate on the whole workspace rather
+than on a single project. The project-scoped QaseAPI client shares the same
+session setup.
+"""
+
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Iterator, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    from json import dumps as json_dumps, loads as json_loads
+
+
+@lru_cache(maxsize=4)
+def _read_config(config_path: str) -> Dict[str, Any]:
+    """
+    Read and parse a JSON config file, once per path and process.
+
+    Args:
+        config_path: Path to the config file
+
+    Returns:
+        Parsed configuration (shared between callers; do not modify)
+    """
+    with open(config_path, 'rb') as f:
+        return json_loads(f.read())
+
+
+def load_config(config_path: str = "config.json") -> Dict[str, Any]:
+    """
+    Load configuration from a JSON file.
+
+    Args:
+        config_path: Path to the config file
+
+    Returns:
+        Dictionary with configuration values
+
+    Raises:
+        FileNotFoundError: If config file doesn't exist
+        ValueError: If config file is invalid or missing required fields
+    """
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(
+            f"Config file '{config_path}' not found. "
+            f"Please create it with 'api_token' field."
+        )
+
+    # Callers get their own copy of the cached config
+    config = dict(_read_config(config_path))
+
+    if "api_token" not in config:
+        raise ValueError("Config file must contain 'api_token' field")
+
+    if not config.get("api_token"):
+        raise ValueError("API token is empty in config file")
+
+    return config
+
+
+def load_project_config(config_path: str = "config.json") -> Dict[str, Any]:
+    """
+    Load configuration for the scripts that work on a single project.
+
+    Args:
+        config_path: Path to the config file
+
+    Returns:
+        Dictionary with configuration values
+
+    Raises:
+        FileNotFoundError: If config file doesn't exist
+        ValueError: If config file is invalid or missing required fields
+    """
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(
+            f"Config file '{config_path}' not found. "
+            f"Please create it with 'api_token' and 'project_code' fields."
+        )
+
+    config = load_config(config_path)
+
+    if "project_code" not in config:
+        raise ValueError("Config file must contain 'project_code' field")
+
+    return config
+
+
+def make_session(api_token: str, pool_size: int = 32) -> requests.Session:
+    """
+    Create a requests session that reuses keep-alive connections.
+
+    Args:
+        api_token: Qase API token
+        pool_size: Maximum number of pooled connections to the API host
+
+    Returns:
+        Session with auth headers, connection pooling and retries configured
+    """
+    session = requests.Session()
+    session.headers.update({
+        "Token": api_token,
+        "accept": "application/json"
+    })
+    # Only reads are retried here. Failed DELETEs are retried by
+    # delete_attachments_by_size.py's own retry pass, which also covers its
+    # aiohttp path; retrying them here as well would multiply the attempts.
+    retry = Retry(
+        total=5,
+        backoff_factor=0.25,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"]
+    )
+    session.mount("https://", HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    ))
+    return session
+
+
+class QaseClient:
+    """Workspace-level Qase API client sharing one pooled session."""
+
+    def __init__(self, api_token: str, pool_size: int = 32, base_url: str = "https://api.qase.io/v1"):
+        """
+        Initialize the client.
+
+        Args:
+            api_token: Qase API token
+            pool_size: Maximum number of pooled connections to the API host
+            base_url: Base URL for the API (default: https://api.qase.io/v1)
+        """
+        self.api_token = api_token
+        self.base_url = base_url
+        self.session = make_session(api_token, pool_size)
+
+    def fetch_page(
+        self,
+        url: str,
+        offset: int,
+        limit: int,
+        label: str = "entities",
+        extra_params: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a single page from a listing endpoint.
+
+        Args:
+            url: Listing endpoint URL
+            offset: Offset of the first entity on the page
+            limit: Page size
+            label: Plural name of the entities, used in messages
+            extra_params: Additional query parameters, e.g. a server-side filter
+
+        Returns:
+            The page's result dictionary, or None if the request failed
+        """
+        params = {"limit": limit, "offset": offset}
+        if extra_params:
+            params.update(extra_params)
+
+        try:
+            response = self.session.get(url, params=params)
+            response.raise_for_status()
+            data = json_loads(response.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching {label} (offset: {offset}): {e}")
+            if hasattr(e, 'response') and e.response is not None:
+                print(f"Response: {e.response.text}")
+            return None
+
+        if not data.get("status"):
+            print("Error: API returned status false")
+            return None
+
+        return data.get("result", {})
+
+    def iter_paginated(
+        self,
+        url: str,
+        label: str = "entities",
+        page_size: int = 100,
+        max_workers: int = 16,
+        extra_params: Optional[Dict[str, Any]] = None,
+        first_page: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over every entity of a listing endpoint, page by page.
+
+        The first page is fetched on its own to learn the total; the remaining
+        pages are then requested concurrently. Entities are yielded as each page
+        arrives so callers can filter without holding the whole listing.
+
+        Args:
+            url: Listing endpoint URL
+            label: Plural name of the entities, used in messages
+            page_size: Number of entities to request per page
+            max_workers: Number of pages to fetch in parallel
+            extra_params: Additional query parameters sent with every page
+            first_page: Result of an already fetched page at offset 0, if any
+
+        Yields:
+            Entity dictionaries
+        """
+        fetched = 0
+        result = first_page
+        if result is None:
+            result = self.fetch_page(url, 0, page_size, label, extra_params)
+
+        if result is not None:
+            entities = result.get("entities", [])
+            total = result.get("total", 0)
+            fetched += len(entities)
+            print(f"Fetched {len(entities)} {label} (offset: 0, total: {total})")
+            yield from entities
+
+            # Step by the page size the server actually honoured
+            offsets = range(len(entities), total, len(entities)) if entities else range(0)
+            failed_offsets = []
+            latest_total = total
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pages = executor.map(
+                    lambda offset: self.fetch_page(url, offset, page_size, label, extra_params),
+                    offsets
+                )
+                for offset, page in zip(offsets, pages):
+                    if page is None:
+                        failed_offsets.append(offset)
+                        continue
+                    entities = page.get("entities", [])
+                    latest_total = max(latest_total, page.get("total", 0))
+                    fetched += len(entities)
+                    print(f"Fetched {len(entities)} {label} (offset: {offset}, total: {total})")
+                    yield from entities
+
+            # Retry failed pages once, then pick up anything added past the
+            # original total while the pages were being fetched
+            for offset in failed_offsets:
+                page = self.fetch_page(url, offset, page_size, label, extra_params)
+                if page is not None:
+                    entities = page.get("entities", [])
+                    fetched += len(entities)
+                    print(f"Fetched {len(entities)} {label} (offset: {offset}, total: {total})")
+                    yield from entities
+
+            offset = total
+            while offset < latest_total:
+                page = self.fetch_page(url, offset, page_size, label, extra_params)
+                entities = page.get("entities", []) if page else []
+                if not entities:
+                    break
+                fetched += len(entities)
+                print(f"Fetched {len(entities)} {label} (offset: {offset}, total: {latest_total})")
+                yield from entities
+                offset += len(entities)
+
+        print(f"Total {label} fetched: {fetched}")
+
+    def delete(self, url: str) -> None:
+        """
+        Send a DELETE request and discard the response body.
+
+        Args:
+            url: URL of the entity to delete
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed or
+                returned an error status
+        """
+        # Closing the response hands its connection back to the pool, on
+        # the error path as well
+        with self.session.delete(url, stream=True) as response:
+            if not response.ok:
+                # Buffer the error body so callers can still report it
+                # once the response is closed
+                response.content
+            response.raise_for_status()
+            # The body of a successful DELETE is never used: drain it
+            # without buffering it into response.content
+            for _ in response.iter_content(chunk_size=None):
+                pass
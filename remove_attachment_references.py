@@ -9,14 +9,37 @@ from all text fields in Qase test cases, including description, preconditions,
 postconditions, steps, and custom fields.
 """
 
-import json
-import os
 import argparse
 import re
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Optional, Any, List, Tuple
 
-from qase_api import QaseAPI
+from qase_api import QaseAPI, get_client
+from qase_common import load_config
+
+
+# Both reference forms, removed in one pass:
+# 1. [![attachment](...)](index.php?/attachments/get/...) - the full markdown
+#    link structure with attachment ID. Listed first so the link is removed
+#    as a whole rather than leaving its "[...](index.php...)" wrapper behind.
+# 2. ![attachment](URL) - simple markdown image links with "attachment" as alt
+#    text. The URL typically contains /attachment/ in the path.
+_ATTACHMENT_IMAGE = re.compile(r'!\[attachment\]\([^\)]+\)')
+_ATTACHMENT_REFERENCE = re.compile(
+    r'\[!\[attachment\]\([^\)]+\)\]\(index\.php\?/attachments/get/\d+\)'
+    r'|' + _ATTACHMENT_IMAGE.pattern
+)
+
+# Update keys counted once per fixed case in the summary; custom fields
+# are counted individually
+_COUNTED_FIELDS = frozenset(("description", "preconditions", "postconditions", "steps"))
+
+# Minimum number of seconds between two progress bar redraws
+PROGRESS_INTERVAL = 0.05
+
+_BLANK_LINES = re.compile(r'\n{3,}')
 
 
 def remove_attachment_references(text: str) -> str:
@@ -36,31 +59,27 @@ def remove_attachment_references(text: str) -> str:
     if not text:
         return text
     
-    # Pattern 1: [![attachment](...)](index.php?/attachments/get/...)
-    # Matches the full markdown link structure with attachment ID
-    pattern1 = r'\[!\[attachment\]\([^\)]+\)\]\(index\.php\?/attachments/get/\d+\)'
+    # Remove all matches (both patterns in a single pass). Both patterns
+    # need the literal "attachment", and most fields don't contain it.
+    cleaned_text = text
+    if 'attachment' in cleaned_text:
+        cleaned_text = _ATTACHMENT_REFERENCE.sub('', cleaned_text)
+        if '![attachment](' in cleaned_text:
+            # A removal can join the pieces of an image link around it
+            cleaned_text = _ATTACHMENT_IMAGE.sub('', cleaned_text)
     
-    # Pattern 2: ![attachment](URL)
-    # Matches simple markdown image links with "attachment" as alt text
-    # The URL typically contains /attachment/ in the path
-    pattern2 = r'!\[attachment\]\([^\)]+\)'
-    
-    # Remove all matches (apply both patterns)
-    cleaned_text = re.sub(pattern1, '', text)
-    cleaned_text = re.sub(pattern2, '', cleaned_text)
-    
-    # Clean up any extra whitespace or newlines left behind
-    # Replace multiple spaces with single space (but preserve newlines)
-    lines = cleaned_text.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        # Clean up multiple spaces within each line
-        cleaned_line = re.sub(r' +', ' ', line)
-        cleaned_lines.append(cleaned_line)
-    cleaned_text = '\n'.join(cleaned_lines)
+    # Clean up any extra whitespace or newlines left behind. Fields without
+    # references are still tidied and trimmed, but each pass only runs when
+    # there is something for it to collapse.
+    # Replace multiple spaces with single space. Each replace halves the
+    # remaining runs, and the few short runs a removed reference leaves
+    # behind go faster this way than through the regex engine.
+    while '  ' in cleaned_text:
+        cleaned_text = cleaned_text.replace('  ', ' ')
     
     # Replace multiple newlines with at most 2 newlines
-    cleaned_text = re.sub(r'\n{3,}', '\n\n', cleaned_text)
+    if '\n\n\n' in cleaned_text:
+        cleaned_text = _BLANK_LINES.sub('\n\n', cleaned_text)
     
     return cleaned_text.strip()
 
@@ -76,22 +95,89 @@ def ensure_step_has_action(step: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         Step dictionary with guaranteed action field
     """
-    fixed_step = step.copy()
+    # Steps are only copied when they change; most already have an action
+    fixed_step = step
     
     # Ensure action field exists and is not empty
-    if not fixed_step.get("action") or not fixed_step["action"].strip():
+    if not step.get("action") or not step["action"].strip():
+        fixed_step = step.copy()
         fixed_step["action"] = "."
     
     # Recursively fix nested steps
-    if fixed_step.get("steps"):
+    if step.get("steps"):
         fixed_nested_steps = []
-        for nested_step in fixed_step["steps"]:
-            fixed_nested_steps.append(ensure_step_has_action(nested_step))
-        fixed_step["steps"] = fixed_nested_steps
+        nested_changed = False
+        for nested_step in step["steps"]:
+            fixed_nested = ensure_step_has_action(nested_step)
+            fixed_nested_steps.append(fixed_nested)
+            if fixed_nested is not nested_step:
+                nested_changed = True
+        if nested_changed:
+            if fixed_step is step:
+                fixed_step = step.copy()
+            fixed_step["steps"] = fixed_nested_steps
     
     return fixed_step
 
 
+def _fix_step(step: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Recursively remove attachment references from a step and its nested steps.
+    
+    Args:
+        step: Step dictionary from the API (left unmodified)
+    
+    Returns:
+        Tuple of (fixed step, whether anything changed); the step itself is
+        returned when nothing changed
+    """
+    # Cleaned values are collected first, so that only steps that
+    # actually change get copied
+    changes = {}
+    
+    # Fix action
+    action = step.get("action")
+    if action:
+        cleaned_action = remove_attachment_references(action)
+        if action != cleaned_action:
+            action = changes["action"] = cleaned_action
+    
+    # Ensure action is not empty after cleaning
+    if not action or not action.strip():
+        changes["action"] = "."
+    
+    # Fix expected_result
+    if step.get("expected_result"):
+        cleaned_expected = remove_attachment_references(step["expected_result"])
+        if step["expected_result"] != cleaned_expected:
+            changes["expected_result"] = cleaned_expected
+    
+    # Fix data
+    if step.get("data"):
+        cleaned_data = remove_attachment_references(step["data"])
+        if step["data"] != cleaned_data:
+            changes["data"] = cleaned_data
+    
+    # Fix nested steps recursively
+    if step.get("steps"):
+        fixed_nested_steps = []
+        nested_changed = False
+        for nested_step in step["steps"]:
+            fixed_nested, changed = _fix_step(nested_step)
+            fixed_nested_steps.append(fixed_nested)
+            if changed:
+                nested_changed = True
+        if nested_changed:
+            changes["steps"] = fixed_nested_steps
+    
+    if not changes:
+        return step, False
+    
+    fixed_step = step.copy()
+    fixed_step.update(changes)
+    return fixed_step, True
+
+
 def analyze_test_case(test_case: Dict[str, Any]) -> Dict[str, Any]:
     """
     Analyze a test case and return fields that need attachment reference removal.
@@ -131,61 +217,16 @@ def analyze_test_case(test_case: Dict[str, Any]) -> Dict[str, Any]:
         fixed_steps = []
         steps_need_update = False
         
-        def fix_step(step: Dict[str, Any]) -> tuple:
-            """Recursively fix a step and its nested steps."""
-            fixed_step = step.copy()
-            step_changed = False
-            
-            # Fix action
-            if step.get("action"):
-                cleaned_action = remove_attachment_references(step["action"])
-                if step["action"] != cleaned_action:
-                    fixed_step["action"] = cleaned_action
-                    step_changed = True
-            
-            # Ensure action is not empty after cleaning
-            if not fixed_step.get("action") or not fixed_step["action"].strip():
-                fixed_step["action"] = "."
-                step_changed = True
-            
-            # Fix expected_result
-            if step.get("expected_result"):
-                cleaned_expected = remove_attachment_references(step["expected_result"])
-                if step["expected_result"] != cleaned_expected:
-                    fixed_step["expected_result"] = cleaned_expected
-                    step_changed = True
-            
-            # Fix data
-            if step.get("data"):
-                cleaned_data = remove_attachment_references(step["data"])
-                if step["data"] != cleaned_data:
-                    fixed_step["data"] = cleaned_data
-                    step_changed = True
-            
-            # Fix nested steps recursively
-            if step.get("steps"):
-                fixed_nested_steps = []
-                for nested_step in step["steps"]:
-                    fixed_nested, nested_changed = fix_step(nested_step)
-                    fixed_nested_steps.append(fixed_nested)
-                    if nested_changed:
-                        step_changed = True
-                fixed_step["steps"] = fixed_nested_steps
-            
-            return fixed_step, step_changed
-        
         for step in steps:
-            fixed_step, step_changed = fix_step(step)
+            fixed_step, step_changed = _fix_step(step)
             fixed_steps.append(fixed_step)
             if step_changed:
                 steps_need_update = True
         
         if steps_need_update:
-            # Ensure all steps have non-empty action fields before sending
-            final_fixed_steps = []
-            for step in fixed_steps:
-                final_fixed_steps.append(ensure_step_has_action(step))
-            updates["steps"] = final_fixed_steps
+            # _fix_step already gave every step, nested ones included, a
+            # non-empty action
+            updates["steps"] = fixed_steps
     
     # Check custom_fields
     # Note: API expects "custom_field" (singular) as an object with field IDs as keys
@@ -224,47 +265,33 @@ def update_test_case_with_retry(api: QaseAPI, case_id: int, updates: Dict[str, A
     """
     # First attempt
     try:
-        url = f"{api.base_url}/case/{api.project_code}/{case_id}"
-        response = requests.patch(url, headers=api.headers, json=updates)
+        response = api.patch_test_case(case_id, updates)
         response.raise_for_status()
         return True, "Success"
     except requests.exceptions.HTTPError as e:
-        # Check if error is about missing action field
-        if e.response and e.response.status_code == 422:
+        # Check if error is about missing action field. The decision only
+        # depends on whether the phrase appears, so the raw body is searched
+        # rather than parsed.
+        if (e.response is not None and e.response.status_code == 422
+                and b"Action field is required" in e.response.content
+                and "steps" in updates):
+            # Fix all steps to ensure they have non-empty action fields
+            fixed_steps = []
+            for step in updates["steps"]:
+                fixed_step = ensure_step_has_action(step)
+                fixed_steps.append(fixed_step)
+            updates["steps"] = fixed_steps
+            
+            # Retry with fixed steps
             try:
-                error_data = e.response.json()
-                errors = error_data.get("errors", {})
-                
-                # Check if any step has "Action field is required" error
-                has_action_error = False
-                for key, value in errors.items():
-                    if isinstance(value, list) and any("Action field is required" in str(err) for err in value):
-                        has_action_error = True
-                        break
-                    elif isinstance(value, str) and "Action field is required" in value:
-                        has_action_error = True
-                        break
-                
-                if has_action_error and "steps" in updates:
-                    # Fix all steps to ensure they have non-empty action fields
-                    fixed_steps = []
-                    for step in updates["steps"]:
-                        fixed_step = ensure_step_has_action(step)
-                        fixed_steps.append(fixed_step)
-                    updates["steps"] = fixed_steps
-                    
-                    # Retry with fixed steps
-                    try:
-                        response = requests.patch(url, headers=api.headers, json=updates)
-                        response.raise_for_status()
-                        return True, "Success (patched empty actions)"
-                    except requests.exceptions.RequestException as retry_e:
-                        error_msg = f"Failed after patching: {retry_e}"
-                        if hasattr(retry_e, 'response') and retry_e.response is not None:
-                            error_msg += f" - {retry_e.response.text}"
-                        return False, error_msg
-            except (ValueError, KeyError):
-                pass
+                response = api.patch_test_case(case_id, updates)
+                response.raise_for_status()
+                return True, "Success (patched empty actions)"
+            except requests.exceptions.RequestException as retry_e:
+                error_msg = f"Failed after patching: {retry_e}"
+                if hasattr(retry_e, 'response') and retry_e.response is not None:
+                    error_msg += f" - {retry_e.response.text}"
+                return False, error_msg
         
         # Return original error
         error_msg = str(e)
@@ -278,20 +305,6 @@ def update_test_case_with_retry(api: QaseAPI, case_id: int, updates: Dict[str, A
         return False, error_msg
 
 
-def load_config(config_path: str = "config.json") -> Dict[str, Any]:
-    """Load configuration from a JSON file."""
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"Config file '{config_path}' not found.")
-
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-
-    if "api_token" not in config:
-        raise ValueError("Config file must contain 'api_token' field")
-
-    return config
-
-
 def main():
     parser = argparse.ArgumentParser(
         description="Remove attachment references from Qase test cases"
@@ -320,6 +333,12 @@ def main():
         action="store_true",
         help="Show detailed information about each test case"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of concurrent workers for sending updates (default: 8)"
+    )
 
     args = parser.parse_args()
 
@@ -336,8 +355,9 @@ def main():
     if not project_code:
         parser.error("Project code is required (provide via --project or config file)")
 
-    # Initialize API client
-    api = QaseAPI(api_token, project_code)
+    # Initialize API client; the pool keeps a keep-alive connection for every
+    # update worker
+    api = get_client(api_token, project_code, pool_size=max(32, args.workers + 1))
 
     # Get all test cases
     print("=" * 60)
@@ -350,15 +370,18 @@ def main():
         print("VERBOSE MODE - Showing detailed information")
     print()
 
-    test_cases = api.get_all_test_cases()
+    # Cases are streamed page by page; only the total is needed up front
+    # to size the progress bar, and it comes with the first page
+    first_page = api.get_first_test_case_page()
+    total = first_page.get("total", 0) if first_page else 0
 
-    if not test_cases:
+    if not total:
         print("No test cases found.")
         return
 
     # Statistics
     stats = {
-        "total": len(test_cases),
+        "total": total,
         "has_references": 0,
         "fixed": 0,
         "errors": 0,
@@ -375,85 +398,95 @@ def main():
     print(f"\nAnalyzing {stats['total']} test cases for attachment references...")
 
     processed = 0
-    for idx, test_case in enumerate(test_cases, 1):
-        case_id = test_case.get("id")
-        case_code = test_case.get("code", f"C{case_id}")
-        title = test_case.get("title", "Untitled")
-        
-        # Calculate and display progress
-        progress_pct = (idx / stats['total']) * 100
-        progress_bar_length = 40
-        filled = int(progress_bar_length * idx // stats['total'])
-        bar = '=' * filled + '>' + '-' * (progress_bar_length - filled - 1)
-        
-        # Analyze test case for attachment references
-        updates = analyze_test_case(test_case)
-        
-        if updates:
-            stats["has_references"] += 1
+    progress_bar_length = 40
+    last_progress_time = 0.0
+    idx = 0
+
+    # Cases are analyzed in the main thread, while the blocking PATCH requests
+    # go to the thread pool so several are in flight at once
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        future_to_case = {}
+
+        for idx, test_case in enumerate(api.iter_test_cases(first_page), 1):
+            case_id = test_case.get("id")
+            case_code = test_case.get("code", f"C{case_id}")
+            title = test_case.get("title", "Untitled")
             
-            # Count which fields were fixed
-            if "description" in updates:
-                stats["fields_fixed"]["description"] += 1
-            if "preconditions" in updates:
-                stats["fields_fixed"]["preconditions"] += 1
-            if "postconditions" in updates:
-                stats["fields_fixed"]["postconditions"] += 1
-            if "steps" in updates:
-                stats["fields_fixed"]["steps"] += 1
-            if "custom_field" in updates:
-                stats["fields_fixed"]["custom_fields"] += len(updates["custom_field"])
+            # Analyze test case for attachment references
+            updates = analyze_test_case(test_case)
             
-            if args.verbose:
-                print(f"\n  Case {case_code} ({case_id}): '{title}'")
-                print(f"    Fields to fix: {list(updates.keys())}")
+            if updates:
+                stats["has_references"] += 1
+                
+                # Count which fields were fixed
+                for key in _COUNTED_FIELDS.intersection(updates):
+                    stats["fields_fixed"][key] += 1
                 if "custom_field" in updates:
-                    print(f"    Custom fields: {len(updates['custom_field'])} field(s)")
-
-            if not args.dry_run:
-                # Try to update the test case with retry logic
-                success, message = update_test_case_with_retry(api, case_id, updates)
-                if success:
-                    stats["fixed"] += 1
-                    processed += 1
-                    if args.verbose:
-                        if "patched empty actions" in message:
-                            print(f"  [OK] Fixed case {case_code} ({case_id}) - patched empty actions")
-                        else:
-                            print(f"  [OK] Fixed case {case_code} ({case_id})")
-                    else:
-                        if "patched empty actions" in message:
-                            print(f"  [OK] Fixed case {case_code} ({case_id}) - patched empty actions")
-                        else:
-                            print(f"  [OK] Fixed case {case_code} ({case_id})")
+                    stats["fields_fixed"]["custom_fields"] += len(updates["custom_field"])
+                
+                if args.verbose:
+                    print(f"\n  Case {case_code} ({case_id}): '{title}'")
+                    print(f"    Fields to fix: {list(updates.keys())}")
+                    if "custom_field" in updates:
+                        print(f"    Custom fields: {len(updates['custom_field'])} field(s)")
+
+                if not args.dry_run:
+                    # Update the test case with retry logic in the background
+                    future = executor.submit(update_test_case_with_retry, api, case_id, updates)
+                    future_to_case[future] = (case_id, case_code)
                 else:
-                    stats["errors"] += 1
-                    processed += 1
                     if args.verbose:
-                        print(f"  [ERROR] Failed to fix case {case_code} ({case_id}): {message}")
+                        print(f"  [DRY RUN] Would fix case {case_code} ({case_id})")
                     else:
-                        print(f"  [ERROR] Failed to fix case {case_code} ({case_id})")
+                        print(f"  [DRY RUN] Would fix case {case_code} ({case_id})")
+                    stats["fixed"] += 1
+                    processed += 1
             else:
+                processed += 1
+                stats["skipped"] += 1
                 if args.verbose:
-                    print(f"  [DRY RUN] Would fix case {case_code} ({case_id})")
-                else:
-                    print(f"  [DRY RUN] Would fix case {case_code} ({case_id})")
+                    print(f"  [SKIP] Case {case_code} ({case_id}): No attachment references found")
+            
+            # Show progress on last line, redrawn at most every
+            # PROGRESS_INTERVAL seconds; the final line is always drawn below
+            now = time.monotonic()
+            if now - last_progress_time >= PROGRESS_INTERVAL:
+                last_progress_time = now
+                # Cases added since the count was taken must not overflow the bar
+                shown_total = max(stats['total'], idx)
+                progress_pct = (idx / shown_total) * 100
+                filled = int(progress_bar_length * idx // shown_total)
+                bar = '=' * filled + '>' + '-' * (progress_bar_length - filled - 1)
+                print(f"\rProgress: [{bar}] {progress_pct:.1f}% ({idx}/{shown_total}) | Fixed: {stats['fixed']}, Errors: {stats['errors']}, Skipped: {stats['skipped']}", end="", flush=True)
+
+        # Collect update results as they complete
+        for future in as_completed(future_to_case):
+            case_id, case_code = future_to_case[future]
+            success, message = future.result()
+            if success:
                 stats["fixed"] += 1
                 processed += 1
-            
-            # Always show progress on last line
-            print(f"\rProgress: [{bar}] {progress_pct:.1f}% ({idx}/{stats['total']}) | Fixed: {stats['fixed']}, Errors: {stats['errors']}, Skipped: {stats['skipped']}", end="", flush=True)
-        else:
-            processed += 1
-            stats["skipped"] += 1
-            if args.verbose:
-                print(f"  [SKIP] Case {case_code} ({case_id}): No attachment references found")
-                # Show progress on last line
-                print(f"\rProgress: [{bar}] {progress_pct:.1f}% ({idx}/{stats['total']}) | Fixed: {stats['fixed']}, Errors: {stats['errors']}, Skipped: {stats['skipped']}", end="", flush=True)
+                if args.verbose:
+                    if "patched empty actions" in message:
+                        print(f"  [OK] Fixed case {case_code} ({case_id}) - patched empty actions")
+                    else:
+                        print(f"  [OK] Fixed case {case_code} ({case_id})")
+                else:
+                    if "patched empty actions" in message:
+                        print(f"  [OK] Fixed case {case_code} ({case_id}) - patched empty actions")
+                    else:
+                        print(f"  [OK] Fixed case {case_code} ({case_id})")
             else:
-                # Show progress on same line for skipped cases
-                print(f"\rProgress: [{bar}] {progress_pct:.1f}% ({idx}/{stats['total']}) | Fixed: {stats['fixed']}, Errors: {stats['errors']}, Skipped: {stats['skipped']}", end="", flush=True)
-    
+                stats["errors"] += 1
+                processed += 1
+                if args.verbose:
+                    print(f"  [ERROR] Failed to fix case {case_code} ({case_id}): {message}")
+                else:
+                    print(f"  [ERROR] Failed to fix case {case_code} ({case_id})")
+
+    # Cases may have been added or removed while streaming
+    stats["total"] = idx
+
     # Final progress line - always show complete
     print()  # New line after progress bar
     final_bar = '=' * progress_bar_length
@@ -0,0 +1,35 @@
+"""
+Tests for the HTML tag stripping in fix_html_tags.py.
+
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import unittest
+
+from fix_html_tags import strip_html_tags
+
+
+class StrictEntityTests(unittest.TestCase):
+    """Entity references must come out of --strict exactly as they went in."""
+
+    def test_bare_ampersand_gets_no_semicolon(self):
+        self.assertEqual(strip_html_tags('<p>AT&T rocks</p>', strict=True), 'AT&T rocks')
+        self.assertEqual(strip_html_tags('<p>R&D</p>', strict=True), 'R&D')
+
+    def test_unterminated_reference_is_kept_as_is(self):
+        self.assertEqual(strip_html_tags('<p>&amp x</p>', strict=True), '&amp x')
+        self.assertEqual(strip_html_tags('<p>x&#39y</p>', strict=True), 'x&#39y')
+
+    def test_terminated_reference_is_kept_as_is(self):
+        self.assertEqual(strip_html_tags('<p>Q&amp;A &#169;</p>', strict=True), 'Q&amp;A &#169;')
+
+    def test_reference_at_end_of_text(self):
+        self.assertEqual(strip_html_tags('<b>x</b>\nAT&T', strict=True), 'x\nAT&T')
+
+    def test_matches_regex_mode_on_plain_markup(self):
+        text = '<p>R&D</p>\n\n<p>Q&amp;A  &#39;\tend &x</p>'
+        self.assertEqual(strip_html_tags(text, strict=True), strip_html_tags(text))
+
+
+if __name__ == "__main__":
+    unittest.main()
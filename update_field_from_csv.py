@@ -14,9 +14,22 @@ import json
 import os
 import argparse
 import re
-from typing import Dict, Optional, Any, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional, Any, List, Tuple
 
-from qase_api import QaseAPI
+from qase_api import QaseAPI, get_client
+from qase_common import load_project_config
+
+# How long fetched field definitions can be reused across runs with
+# --use-field-cache, in seconds
+FIELD_CACHE_TTL = 3600
+
+_HTML_TAG = re.compile(r'<[^>]+>')
+_SPACE_RUN = re.compile(r'[ \t]+')
+# Whitespace other than line breaks on either side of a line break, i.e.
+# whatever str.strip() would remove from the ends of each line
+_LINE_EDGE_WHITESPACE = re.compile(r'[^\S\n]*\n[^\S\n]*')
+_BLANK_LINES = re.compile(r'\n{3,}')
 
 
 class CSVFieldUpdater:
@@ -29,7 +42,10 @@ class CSVFieldUpdater:
         csv_file_path: str,
         field_name: str,
         field_id: Optional[int] = None,
-        csv_column_name: Optional[str] = None
+        csv_column_name: Optional[str] = None,
+        num_workers: int = 8,
+        use_field_cache: bool = False,
+        skip_unchanged: bool = False
     ):
         """
         Initialize the updater.
@@ -41,12 +57,27 @@ class CSVFieldUpdater:
             field_name: Name of the custom field to update
             field_id: Optional custom field ID (if not provided, will search by name)
             csv_column_name: Name of the CSV column to read (defaults to field_name)
+            num_workers: Number of concurrent workers used to send updates
+            use_field_cache: If True, reuse field definitions cached on disk by an earlier run
+                             instead of fetching them
+            skip_unchanged: If True, don't update cases whose field already has the CSV value
         """
-        self.api = QaseAPI(api_token, project_code)
+        # The pool keeps a keep-alive connection for every update worker
+        self.api = get_client(
+            api_token,
+            project_code,
+            field_cache_ttl=FIELD_CACHE_TTL,
+            # Fresh definitions are always fetched unless asked otherwise, and
+            # still update the cache for later runs that opt in
+            refresh_field_cache=not use_field_cache,
+            pool_size=max(32, num_workers + 1)
+        )
         self.csv_file_path = csv_file_path
         self.field_name = field_name
         self.field_id = field_id
         self.csv_column_name = csv_column_name or field_name
+        self.num_workers = num_workers
+        self.skip_unchanged = skip_unchanged
 
     @staticmethod
     def strip_html_tags(text: str) -> str:
@@ -62,24 +93,25 @@ class CSVFieldUpdater:
         if not text:
             return text
         
+        # Most CSV values are plain text, so each pass below only runs when
+        # a substring check shows it has something to change.
         # Remove HTML tags using regex
         # This pattern matches <tag>content</tag> and removes the tags
-        text = re.sub(r'<[^>]+>', '', text)
-        
-        # Preserve newlines but clean up extra spaces within lines
-        # Replace multiple spaces (but not newlines) with single space
-        lines = text.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            # Clean up multiple spaces within each line
-            cleaned_line = re.sub(r'[ \t]+', ' ', line.strip())
-            cleaned_lines.append(cleaned_line)
+        if '<' in text:
+            text = _HTML_TAG.sub('', text)
         
-        # Join lines back together, preserving single newlines
-        text = '\n'.join(cleaned_lines)
-        
-        # Clean up excessive consecutive newlines (more than 2) to max 2
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        # Preserve newlines but clean up extra spaces within lines:
+        # collapse runs of spaces and tabs, then trim every line. Lines are
+        # not split apart; the first and last line are trimmed by the final
+        # strip().
+        if '\t' in text or '  ' in text:
+            text = _SPACE_RUN.sub(' ', text)
+        if '\n' in text:
+            text = _LINE_EDGE_WHITESPACE.sub('\n', text)
+            
+            # Clean up excessive consecutive newlines (more than 2) to max 2
+            if '\n\n\n' in text:
+                text = _BLANK_LINES.sub('\n\n', text)
         
         return text.strip()
 
@@ -113,11 +145,9 @@ class CSVFieldUpdater:
                 case_code = row.get('ID', '').strip()
                 field_value = row.get(self.csv_column_name, '').strip()
                 
-                # Strip HTML tags from field value
-                field_value = self.strip_html_tags(field_value)
-                
                 if case_code:
-                    csv_data[case_code] = field_value
+                    # Strip HTML tags from field value
+                    csv_data[case_code] = self.strip_html_tags(field_value)
         
         print(f"Loaded {len(csv_data)} test cases from CSV")
         return csv_data
@@ -188,44 +218,46 @@ class CSVFieldUpdater:
                 "skipped": 0
             }
 
-        # Fetch all test cases
-        test_cases = self.api.get_all_test_cases()
-        
-        # Create a mapping of test case codes to test case objects
-        # Map both with and without "C" prefix to handle different formats
+        # Codes the CSV asks for, in the form the test case map is keyed by
+        wanted_keys = {_case_key(case_code) for case_code in csv_data}
+
+        # Create a mapping of test case codes to test case objects, keyed by
+        # the code without its "C" prefix so that CSV codes with and without
+        # the prefix match with a single lookup. Cases are streamed page by
+        # page and only those named in the CSV are kept.
         test_case_map = {}
         sample_codes = []
-        for test_case in test_cases:
+        cases_with_codes = 0
+        first_case = None
+        for test_case in self.api.iter_test_cases():
+            if first_case is None:
+                first_case = test_case
             # Try different possible field names for the code
             case_code = test_case.get("code") or test_case.get("case_code") or test_case.get("id")
             if case_code:
                 # Convert to string
                 case_code_str = str(case_code)
-                # Store with the code as-is
-                test_case_map[case_code_str] = test_case
-                # Also store with "C" prefix if it doesn't have one (for CSV matching)
-                if not case_code_str.startswith("C"):
-                    test_case_map[f"C{case_code_str}"] = test_case
-                # Also store without "C" prefix if it has one
-                elif case_code_str.startswith("C"):
-                    test_case_map[case_code_str[1:]] = test_case
+                case_key = _case_key(case_code_str)
+                if case_key in wanted_keys:
+                    test_case_map[case_key] = test_case
+                cases_with_codes += 1
                 
                 if len(sample_codes) < 5:
                     sample_codes.append(case_code_str)
         
         # Debug: Show sample codes to help diagnose matching issues
-        if len(test_case_map) > 0:
-            print(f"\nFound {len(test_case_map)} test cases with codes in Qase project")
+        if cases_with_codes > 0:
+            print(f"\nFound {cases_with_codes} test cases with codes in Qase project")
             print(f"Sample Qase codes: {sample_codes[:5]}")
             if len(csv_data) > 0:
                 csv_codes_sample = list(csv_data.keys())[:5]
                 print(f"Sample CSV codes: {csv_codes_sample}")
         else:
             print(f"\nWarning: No test cases with 'code' field found.")
-            if len(test_cases) > 0:
-                print(f"Sample test case keys: {list(test_cases[0].keys())[:10]}")
+            if first_case is not None:
+                print(f"Sample test case keys: {list(first_case.keys())[:10]}")
                 if verbose:
-                    print(f"Sample test case: {json.dumps(test_cases[0], indent=2, default=str)[:500]}")
+                    print(f"Sample test case: {json.dumps(first_case, indent=2, default=str)[:500]}")
 
         print(f"Matching CSV data to Qase test cases...")
 
@@ -238,16 +270,19 @@ class CSVFieldUpdater:
             "skipped": 0
         }
 
+        # Updates to send, grouped by test case. Several CSV rows (e.g. "C12"
+        # and "12") can match the same case; its updates are sent one after
+        # another, in CSV order, so the last row still wins.
+        pending_updates: Dict[Any, List[Tuple[str, Dict[str, Any]]]] = {}
+        # Value each case will have once the updates queued so far are sent
+        queued_values: Dict[Any, str] = {}
+        # Custom field values are keyed by the field ID as a string
+        field_key = str(field_id)
+
         # Process each CSV row
         for case_code, csv_field_value in csv_data.items():
-            # Try to find test case with CSV code as-is, with "C" prefix, or without "C" prefix
-            test_case = test_case_map.get(case_code)
-            if not test_case and case_code.startswith("C"):
-                # Try without "C" prefix
-                test_case = test_case_map.get(case_code[1:])
-            if not test_case and not case_code.startswith("C"):
-                # Try with "C" prefix
-                test_case = test_case_map.get(f"C{case_code}")
+            # Find the test case whether or not the CSV code has the "C" prefix
+            test_case = test_case_map.get(_case_key(case_code))
             
             if not test_case:
                 stats["not_found"] += 1
@@ -257,27 +292,35 @@ class CSVFieldUpdater:
 
             stats["matched"] += 1
             case_id = test_case.get("id")
-            title = test_case.get("title", "Untitled")
             
-            # Check current field value (for display purposes only)
             current_field_value = ""
-            custom_fields = test_case.get("custom_fields", [])
-            for field in custom_fields:
-                if field.get("id") == field_id:
-                    current_field_value = field.get("value", "")
-                    break
-
-            # Always update with CSV value (don't skip even if values match)
-            # This ensures CSV is the source of truth
+            if verbose or self.skip_unchanged:
+                # Check current field value
+                custom_fields = test_case.get("custom_fields", [])
+                for field in custom_fields:
+                    if field.get("id") == field_id:
+                        current_field_value = field.get("value") or ""
+                        break
+
+            # Unless asked to skip unchanged values, always update with the
+            # CSV value (don't skip even if values match). This ensures CSV is
+            # the source of truth
+            if self.skip_unchanged and queued_values.get(case_id, current_field_value) == csv_field_value:
+                stats["skipped"] += 1
+                if verbose:
+                    print(f"  [SKIP] Case {case_code} ({case_id}) already has this {self.field_name} value")
+                continue
+            queued_values[case_id] = csv_field_value
 
             # Prepare update
             updates = {
                 "custom_field": {
-                    str(field_id): csv_field_value
+                    field_key: csv_field_value
                 }
             }
 
             if verbose:
+                title = test_case.get("title", "Untitled")
                 print(f"\n  Case {case_code} ({case_id}): '{title}'")
                 current_display = current_field_value[:100] + ('...' if len(current_field_value) > 100 else '')
                 csv_display = csv_field_value[:100] + ('...' if len(csv_field_value) > 100 else '')
@@ -285,16 +328,31 @@ class CSVFieldUpdater:
                 print(f"    Updating: {csv_display}")
 
             if not dry_run:
-                if self.api.update_test_case(case_id, updates):
-                    stats["updated"] += 1
-                    print(f"  [OK] Successfully updated case {case_code} ({case_id})")
-                else:
-                    stats["errors"] += 1
-                    print(f"  [ERROR] Failed to update case {case_code} ({case_id})")
+                pending_updates.setdefault(case_id, []).append((case_code, updates))
             else:
                 print(f"  [DRY RUN] Would update case {case_code} ({case_id}) with {self.field_name}")
                 stats["updated"] += 1  # Count as would-be updated in dry run
 
+        if pending_updates:
+            # Send the blocking PATCH requests from a thread pool so several
+            # are in flight at once
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                future_to_case = {
+                    executor.submit(_send_case_updates, self.api, case_id, case_updates): case_id
+                    for case_id, case_updates in pending_updates.items()
+                }
+
+                # Collect update results as they complete
+                for future in as_completed(future_to_case):
+                    case_id = future_to_case[future]
+                    for case_code, success in future.result():
+                        if success:
+                            stats["updated"] += 1
+                            print(f"  [OK] Successfully updated case {case_code} ({case_id})")
+                        else:
+                            stats["errors"] += 1
+                            print(f"  [ERROR] Failed to update case {case_code} ({case_id})")
+
         return stats
 
     def run(self, dry_run: bool = False, verbose: bool = False):
@@ -330,35 +388,36 @@ class CSVFieldUpdater:
         print("=" * 60)
 
 
-def load_config(config_path: str = "config.json") -> Dict[str, Any]:
+def _case_key(case_code: str) -> str:
     """
-    Load configuration from a JSON file.
+    Get the key a test case code is matched by, e.g. '12' for both 'C12' and '12'.
 
     Args:
-        config_path: Path to the config file
+        case_code: Test case code from Qase or the CSV file
 
     Returns:
-        Dictionary with configuration values
-
-    Raises:
-        FileNotFoundError: If config file doesn't exist
-        ValueError: If config file is invalid or missing required fields
+        The code without its "C" prefix
     """
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(
-            f"Config file '{config_path}' not found. "
-            f"Please create it with 'api_token' and 'project_code' fields."
-        )
+    return case_code[1:] if case_code.startswith("C") else case_code
 
-    with open(config_path, 'r') as f:
-        config = json.load(f)
 
-    if "api_token" not in config:
-        raise ValueError("Config file must contain 'api_token' field")
-    if "project_code" not in config:
-        raise ValueError("Config file must contain 'project_code' field")
+def _send_case_updates(
+    api: QaseAPI,
+    case_id: int,
+    case_updates: List[Tuple[str, Dict[str, Any]]]
+) -> List[Tuple[str, bool]]:
+    """
+    Worker function for sending the updates of a single test case in order.
+
+    Args:
+        api: Qase API client
+        case_id: ID of the test case to update
+        case_updates: List of (CSV case code, updates) in CSV order
 
-    return config
+    Returns:
+        List of (CSV case code, success) tuples
+    """
+    return [(case_code, api.update_test_case(case_id, updates)) for case_code, updates in case_updates]
 
 
 def main():
@@ -408,6 +467,22 @@ def main():
         action="store_true",
         help="Show detailed information about each test case"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of concurrent workers for sending updates (default: 8)"
+    )
+    parser.add_argument(
+        "--use-field-cache",
+        action="store_true",
+        help="Reuse custom field definitions fetched by a run in the last hour"
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help="Don't update test cases whose field already has the CSV value"
+    )
 
     args = parser.parse_args()
 
@@ -419,7 +494,7 @@ def main():
     csv_column_name = args.csv_column
 
     try:
-        config = load_config(args.config)
+        config = load_project_config(args.config)
         api_token = api_token or config.get("api_token")
         project_code = project_code or config.get("project_code")
         
@@ -469,7 +544,10 @@ def main():
         csv_file_path=args.csv_file,
         field_name=field_name,
         field_id=field_id,
-        csv_column_name=csv_column_name
+        csv_column_name=csv_column_name,
+        num_workers=args.workers,
+        use_field_cache=args.use_field_cache,
+        skip_unchanged=args.skip_unchanged
     )
 
     updater.run(dry_run=args.dry_run, verbose=args.verbose)